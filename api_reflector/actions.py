@@ -5,8 +5,7 @@ import json
 import time
 from enum import Enum
 
-import requests
-
+from api_reflector.callbacks import callback_dispatcher
 from api_reflector.reporting import get_logger
 from api_reflector.storage import GlobalStorage
 from settings import settings
@@ -27,10 +26,10 @@ class Action(Enum):
         return self.value
 
 
-def delay(*args, **_kwargs) -> None:
+def delay_length(*args) -> float:
     """
-    Sleep for an amount of time.
-    Takes a single positional argument; the number of seconds to sleep for.
+    Returns the number of seconds a delay action with the given arguments should last, clamped to the configured
+    maximum.
     """
     length = float(args[0])
 
@@ -41,12 +40,21 @@ def delay(*args, **_kwargs) -> None:
         )
         length = min(length, settings.maximum_delay_length)
 
-    time.sleep(length)
+    return length
+
+
+def delay(*args, **_kwargs) -> None:
+    """
+    Sleep for an amount of time.
+    Takes a single positional argument; the number of seconds to sleep for.
+    On a gevent worker this only suspends the current request, see `api_reflector.green`.
+    """
+    time.sleep(delay_length(*args))
 
 
 def process_callback(*args, **kwargs):
     """
-    Sends a post request to a given URL.
+    Queues a post request to a given URL, to be sent in the background.
     Takes arguments in key=value format. Requires one `url` argument to be set this way.
     Additional key=value arguments are sent to the given URL as a JSON payload.
     Request and response are also included in this request by default.
@@ -60,10 +68,7 @@ def process_callback(*args, **kwargs):
     # Add the kwargs to the new data_dict to provide one dict to send in the request to the callback service
     data_dict |= kwargs
 
-    try:
-        requests.request("POST", url=data_dict["url"], data=json.dumps(data_dict), timeout=5)
-    except requests.exceptions.RequestException as ex:
-        log.warning(f"Check all Action arguments have been provided and that the callback service is running`{ex}`")
+    callback_dispatcher.submit(data_dict["url"], json.dumps(data_dict))
 
 
 def storage_set(*args, **_kwargs) -> None:
@@ -3,16 +3,20 @@ Declares the flask-admin instance and sets up the model views.
 """
 import json
 from json import JSONDecodeError
+from typing import Optional
 
-from flask import redirect, url_for
+from flask import flash, g, redirect, url_for
 from flask_admin import Admin, AdminIndexView
+from flask_admin.actions import action
 from flask_admin.contrib.sqla import ModelView
 from flask_admin.menu import MenuLink
 from jinja2.runtime import Context
 from slugify import slugify
+from sqlalchemy import inspect
 from wtforms import validators
 
-from api_reflector import auth, db, models
+from api_reflector import auth, db, models, notifications, scenarios
+from api_reflector.snapshot import config_store
 
 
 def is_valid_json(data: str) -> None:
@@ -64,6 +68,7 @@ admin = Admin(name="API Reflector", template_mode="bootstrap3", index_view=Restr
 class RestrictedView(ModelView):
     """
     Overrides ModelView to implement OSS authentication before accessing.
+    Any change made through the admin reloads the affected endpoints in every worker.
     """
 
     def is_accessible(self):
@@ -72,6 +77,18 @@ class RestrictedView(ModelView):
     def inaccessible_callback(self, name, **kwargs):
         return redirect(url_for("azure.login"))
 
+    def changed_endpoints(self, _model) -> Optional[set[int]]:
+        """
+        Returns the ids of the endpoints affected by a change to the given model, or None if any endpoint may be.
+        """
+        return None
+
+    def after_model_change(self, form, model, is_created):
+        notifications.config_changed(self.changed_endpoints(model))
+
+    def after_model_delete(self, model):
+        notifications.config_changed(self.changed_endpoints(model))
+
 
 @admin_view(models.Tag)
 class TagView(RestrictedView):
@@ -86,6 +103,27 @@ class TagView(RestrictedView):
             form.name.data = slugify(form.data["name"])
         return super().validate_form(form)
 
+    def changed_endpoints(self, _model) -> Optional[set[int]]:
+        # tags aren't part of the mock configuration snapshot, so changing them doesn't affect any endpoint. the change
+        # is still published with no endpoints, which bumps the configuration version.
+        return set()
+
+    @action("activate", "Activate scenario", "Make the responses with the selected tags the only active responses?")
+    def action_activate(self, ids):
+        """
+        Activates the scenario of each selected tag in turn.
+        """
+        tags = models.Tag.query.filter(models.Tag.id.in_(ids)).order_by(models.Tag.name).all()
+        with db.sqla.engine.connect() as connection:
+            for tag in tags:
+                summary = scenarios.activate_scenario(connection, tag.name)
+                config_store.apply_active(summary.changes)
+                notifications.publish(summary.endpoints)
+                flash(
+                    f"Activated scenario `{tag.name}`: {len(summary.activated)} responses activated, "
+                    f"{len(summary.deactivated)} deactivated."
+                )
+
 
 @admin_view(models.Endpoint)
 class EndpointView(RestrictedView):
@@ -105,6 +143,9 @@ class EndpointView(RestrictedView):
             form.path.data = f"/{form.data['path']}"
         return super().validate_form(form)
 
+    def changed_endpoints(self, model) -> Optional[set[int]]:
+        return {model.id}
+
 
 @admin_view(models.Response)
 class ResponseView(RestrictedView):
@@ -122,6 +163,12 @@ class ResponseView(RestrictedView):
             validator(form.content.data)
             super().on_model_change(form, model, is_created)
 
+        # a response moved to another endpoint changes the endpoint it left too.
+        g.previous_endpoints = {endpoint.id for endpoint in inspect(model).attrs.endpoint.history.deleted if endpoint}
+
+    def changed_endpoints(self, model) -> Optional[set[int]]:
+        return {model.endpoint_id, *g.pop("previous_endpoints", set())}
+
     def content_formatter(self, _ctx: Context, model: models.Model, _name: str):
         """
         Limits the content field to a maximum length in the list view.
@@ -136,4 +183,19 @@ class ResponseView(RestrictedView):
     }
 
 
+@admin_view(models.JournalEntry)
+class JournalView(RestrictedView):
+    """
+    Read-only admin modelview for the request journal.
+    """
+
+    can_create = False
+    can_edit = False
+    can_delete = False
+    can_view_details = True
+    column_list = ("recorded_at", "method", "path", "status_code", "endpoint_id", "response_id", "duration")
+    column_default_sort = ("recorded_at", True)
+    column_filters = ("method", "path", "status_code", "endpoint_id", "response_id")
+
+
 admin.add_link(MenuLink(name="Home", url="/"))
@@ -2,6 +2,10 @@
 Provides the top level flask application configuration.
 """
 
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
 import sentry_sdk
 from flask import Flask
 from flask_cors import CORS
@@ -10,9 +14,11 @@ from sentry_sdk.integrations.flask import FlaskIntegration
 from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-from api_reflector import db
+from api_reflector import db, green
 from api_reflector.admin import admin
+from api_reflector.manifest import serve_manifest
 from api_reflector.migrations import run_migrations
+from api_reflector.notifications import config_listener
 from api_reflector.reporting import get_logger
 from api_reflector.views import api
 from settings import settings
@@ -20,52 +26,105 @@ from settings import settings
 log = get_logger(__name__)
 
 
+class StartupTimer:
+    """
+    Records how long each phase of app initialisation takes.
+    """
+
+    def __init__(self) -> None:
+        self.phases: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Times the enclosed block as the named phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def report(self) -> str:
+        """
+        Returns a summary of the recorded phases.
+        """
+        total = sum(self.phases.values())
+        phases = ", ".join(f"{name}: {duration * 1000:.1f}ms" for name, duration in self.phases.items())
+        return f"{total * 1000:.1f}ms ({phases})"
+
+
 def create_app() -> Flask:
     """
     Creates a flask application and registers the api blueprint.
     """
-    if settings.sentry_dsn:
-        log.debug("Initialising Sentry SDK.")
-        sentry_sdk.init(  # pylint: disable=abstract-class-instantiated
-            dsn=settings.sentry_dsn,
-            integrations=[FlaskIntegration(), SqlalchemyIntegration()],
-        )
+    timer = StartupTimer()
+
+    with timer.phase("sentry"):
+        if settings.sentry_dsn:
+            log.debug("Initialising Sentry SDK.")
+            sentry_sdk.init(  # pylint: disable=abstract-class-instantiated
+                dsn=settings.sentry_dsn,
+                integrations=[FlaskIntegration(), SqlalchemyIntegration()],
+            )
+
+    with timer.phase("gevent"):
+        green.patch()
 
     log.debug("Initializing app.")
 
-    app = Flask(__name__)
-    CORS(app)
-    app.wsgi_app = ProxyFix(  # type: ignore
-        app.wsgi_app,
-        x_proto=int(settings.use_x_forwarded_proto),
-        x_host=int(settings.use_x_forwarded_host),
-    )
-
-    app.config.update(
-        SECRET_KEY=settings.secret_key,
-        SQLALCHEMY_DATABASE_URI=settings.postgres_dsn,
-        SQLALCHEMY_ENGINE_OPTIONS=settings.postgres_engine_options,
-        SQLALCHEMY_TRACK_MODIFICATIONS=False,
-        FLASK_ADMIN_SWATCH="darkly",
-    )
-
-    if settings.azure_auth_enabled:
-        azure_blueprint = make_azure_blueprint(
-            client_id=settings.azure_client_id,
-            client_secret=settings.azure_client_secret,
-            tenant=settings.azure_tenant,
-            redirect_url="/",
+    with timer.phase("app"):
+        app = Flask(__name__)
+        CORS(app)
+        app.wsgi_app = ProxyFix(  # type: ignore
+            app.wsgi_app,
+            x_proto=int(settings.use_x_forwarded_proto),
+            x_host=int(settings.use_x_forwarded_host),
         )
-        app.register_blueprint(azure_blueprint)
 
-    db.sqla.init_app(app)
-    admin.init_app(app)
+        app.config.update(
+            SECRET_KEY=settings.secret_key,
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+            FLASK_ADMIN_SWATCH="darkly",
+        )
+
+        if settings.azure_auth_enabled:
+            azure_blueprint = make_azure_blueprint(
+                client_id=settings.azure_client_id,
+                client_secret=settings.azure_client_secret,
+                tenant=settings.azure_tenant,
+                redirect_url="/",
+            )
+            app.register_blueprint(azure_blueprint)
+
+        if settings.manifest_path is None:
+            app.config.update(
+                SQLALCHEMY_DATABASE_URI=settings.postgres_dsn,
+                SQLALCHEMY_ENGINE_OPTIONS=settings.postgres_engine_options,
+            )
+            db.sqla.init_app(app)
+            admin.init_app(app)
+
+        app.register_blueprint(api)
 
-    app.register_blueprint(api)
+    if settings.manifest_path is not None:
+        with timer.phase("manifest"):
+            log.debug(f"Serving mocks from manifest `{settings.manifest_path}`.")
+            serve_manifest(settings.manifest_path, settings.manifest_poll_interval)
+    else:
+        with timer.phase("migrations"):
+            if settings.migrate_on_startup:
+                log.debug("Migrating database.")
+                if not run_migrations.upgrade_if_needed():
+                    log.debug("Database is already at the latest revision.")
+            else:
+                log.debug("Skipping database migration.")
 
-    log.debug("Migrating database.")
-    run_migrations.main()
+        if settings.config_notifications_enabled:
+            config_listener.start(app)
+            # workers forked from this process start listening on their first request.
+            app.before_request(config_listener.ensure_started)
 
-    log.debug("App initialisation complete.")
+    log.info(f"App initialisation complete in {timer.report()}")
 
     return app
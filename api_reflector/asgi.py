@@ -0,0 +1,213 @@
+"""
+Provides an ASGI application that serves mocks with an async request pipeline.
+
+Requests to `/mock/<path>` are handled on the event loop. Matching, scoring and rendering work on the in-memory
+configuration snapshot, and DELAY actions are awaited with `asyncio.sleep`, so a single process can hold thousands of
+in-flight mock requests. Everything else, including the admin UI, is passed through to the flask app unchanged.
+
+Requires the `asgi` extra. Run with `uvicorn asgi:application`.
+"""
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Mapping, MutableMapping, Optional
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import Flask
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.exceptions import BadRequest, HTTPException
+from werkzeug.wrappers import Response
+
+from api_reflector import actions, compression, journal, metrics, pipeline, rules_engine
+from api_reflector.api import create_app
+from api_reflector.endpoint import Method, ensure_leading_slash
+from api_reflector.notifications import config_listener
+from api_reflector.reporting import get_logger
+from api_reflector.snapshot import EndpointSnapshot, ResponseSnapshot, config_store
+from settings import settings
+
+log = get_logger(__name__)
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+MOCK_PREFIX = "/mock/"
+MOCK_METHODS = {str(method) for method in Method}
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _send_response(send: Send, response: Response) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": [(key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in response.headers],
+        }
+    )
+    if not response.is_streamed:
+        await send({"type": "http.response.body", "body": response.get_data()})
+        return
+
+    # streamed templates render as they're iterated, so each chunk is pulled in a thread to keep the loop free.
+    chunks = response.iter_encoded()
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            break
+        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _parse_json(headers: Headers, body: bytes) -> Any:
+    """
+    Parses the request body the same way flask's `request.json` would, or returns an empty dict for non-JSON requests.
+    """
+    mimetype = headers.get("Content-Type", "").split(";")[0].strip().lower()
+    is_json = mimetype == "application/json" or (mimetype.startswith("application/") and mimetype.endswith("+json"))
+    if not is_json:
+        return {}
+
+    try:
+        return json.loads(body)
+    except ValueError as ex:
+        raise BadRequest(f"Failed to decode JSON object: {ex}") from ex
+
+
+class MockASGIApp:
+    """
+    Serves mock endpoints natively and passes all other requests through to the given flask app.
+    """
+
+    def __init__(self, flask_app: Flask) -> None:
+        self.flask_app = flask_app
+        self.wsgi_app = WsgiToAsgi(flask_app)
+        # the postgres storage backend blocks on the database, so its work is kept off the event loop.
+        self.offload = settings.storage_backend == "postgres"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http" and scope["path"].startswith(MOCK_PREFIX) and scope["method"] in MOCK_METHODS:
+            await self.mock(scope, receive, send)
+        else:
+            await self.wsgi_app(scope, receive, send)
+
+    async def lifespan(self, receive: Receive, send: Send) -> None:
+        """
+        Acknowledges lifespan events. The flask app is already set up by the time we're serving.
+        """
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def mock(self, scope: Scope, receive: Receive, send: Send) -> None:  # pylint: disable=too-many-locals
+        """
+        Mock endpoint. Tries to map the requested path to a configured mock.
+        """
+        # mock requests bypass flask, so they start the configuration listener in forked workers themselves.
+        config_listener.ensure_started()
+        body = await _read_body(receive)
+        headers = Headers([(key.decode("latin-1"), value.decode("latin-1")) for key, value in scope["headers"]])
+
+        start = time.perf_counter()
+        endpoint_label = metrics.UNMATCHED
+        trace = journal.Trace()
+        path = ensure_leading_slash(scope["path"][len(MOCK_PREFIX) :])
+        with self.flask_app.app_context():
+            try:
+                if config_store.is_stale:
+                    snapshot = await asyncio.to_thread(config_store.current)
+                else:
+                    snapshot = config_store.current()
+
+                with metrics.timed("match_endpoint", trace.timings):
+                    endpoint, params = snapshot.match(scope["method"], path)
+                endpoint_label = metrics.endpoint_label(endpoint)
+                trace.endpoint_id = endpoint.id
+
+                log.info("Matched `%s` to endpoint: %s", path, endpoint)
+
+                response = await self._serve(endpoint, params, scope, headers, body, trace)
+            except HTTPException as ex:
+                response = ex.get_response()
+
+            duration = time.perf_counter() - start
+            metrics.observe_request(endpoint_label, scope["method"], response.status_code, duration)
+            if settings.journal_enabled:
+                journal.request_journal.record(
+                    journal.make_hit(scope["method"], path, headers, body, response.status_code, duration, trace)
+                )
+
+        # match the headers flask-cors adds to every flask response.
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        await _send_response(send, response)
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.offload:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def _serve(  # pylint: disable=too-many-arguments
+        self,
+        endpoint: EndpointSnapshot,
+        params: Mapping[str, Any],
+        scope: Scope,
+        headers: Headers,
+        body: bytes,
+        trace: journal.Trace,
+    ) -> Response:
+        # the body and query string are only parsed if one of the endpoint's responses reads them.
+        req_json = _parse_json(headers, body) if "json" in endpoint.request_fields else {}
+        if "query" in endpoint.request_fields:
+            query = MultiDict(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+        else:
+            query = pipeline.EMPTY_QUERY
+        templateable_request = rules_engine.TemplatableRequest(
+            params=params, json=req_json, query=query, headers=headers
+        )
+
+        try:
+            response: Optional[ResponseSnapshot] = await self._run(
+                pipeline.choose_response, endpoint, templateable_request, trace.timings
+            )
+            if response is None:
+                return Response(pipeline.NO_ACTIVE_RESPONSES, status=501)
+            trace.response_id = response.id
+
+            body, content = await self._run(pipeline.render_body, response, templateable_request, trace.timings)
+
+            with metrics.timed("execute_actions", trace.timings):
+                for action in response.actions:
+                    if action.action is actions.Action.DELAY:
+                        await asyncio.sleep(actions.delay_length(*action.arguments))
+                    else:
+                        await self._run(action.execute, req_json, content)
+
+        except pipeline.TEMPLATE_ERRORS as ex:
+            return Response(pipeline.template_error_message(ex), status=500, mimetype="text/plain")
+
+        if isinstance(body, (bytes, str)):
+            return compression.build_response(response, body, scope["method"], headers)
+        return Response(body, status=response.status_code, mimetype=response.content_type)
+
+
+def create_asgi_app() -> MockASGIApp:
+    """
+    Creates the flask application and wraps it in an ASGI app that serves mocks natively.
+    """
+    return MockASGIApp(create_app())
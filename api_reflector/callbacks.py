@@ -0,0 +1,213 @@
+"""
+Delivers CALLBACK action requests in the background.
+
+Callbacks are put on a bounded queue and sent by a pool of worker threads, so the mock response doesn't wait for the
+callback target. Each target host gets its own pooled `requests.Session`. Failed deliveries are retried with
+exponential backoff, and callbacks that arrive while the queue is full are dropped.
+"""
+import os
+import queue
+import threading
+import time
+from typing import Iterator, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from api_reflector import metrics
+from api_reflector.reporting import get_logger
+from settings import settings
+
+log = get_logger(__name__)
+
+# responses with these status codes are retried, everything else is considered delivered.
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class Callback(NamedTuple):
+    """
+    A callback waiting to be delivered.
+    """
+
+    url: str
+    data: str
+    enqueued_at: float
+
+
+class CallbackStats(NamedTuple):
+    """
+    Counters describing the dispatcher's activity since it was created.
+    """
+
+    queue_depth: int
+    enqueued: int
+    dropped: int
+    delivered: int
+    failed: int
+    retries: int
+    # total and maximum time between enqueueing and delivering a callback, in seconds.
+    latency_total: float
+    latency_max: float
+
+
+class CallbackDispatcher:  # pylint: disable=too-many-instance-attributes
+    """
+    A bounded queue of callbacks and the pool of threads that delivers them.
+    Threads are started on first use in each process, so the dispatcher is safe to create before gunicorn forks.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self, concurrency: int, queue_size: int, max_retries: int, retry_backoff: float, timeout: float
+    ) -> None:
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+
+        self._queue: queue.Queue[Callback] = queue.Queue(maxsize=queue_size)
+        self._sessions: dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+
+        self._enqueued = 0
+        self._dropped = 0
+        self._delivered = 0
+        self._failed = 0
+        self._retries = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def submit(self, url: str, data: str) -> bool:
+        """
+        Queues a callback for delivery. Returns false if the queue is full and the callback was dropped.
+        """
+        self._ensure_started()
+
+        try:
+            self._queue.put_nowait(Callback(url=url, data=data, enqueued_at=time.monotonic()))
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            log.warning(f"Callback queue is full, dropping callback to {url}")
+            return False
+
+        with self._lock:
+            self._enqueued += 1
+        return True
+
+    def join(self) -> None:
+        """
+        Blocks until every queued callback has been processed.
+        """
+        self._queue.join()
+
+    def stats(self) -> CallbackStats:
+        """
+        Returns the dispatcher's current counters.
+        """
+        with self._lock:
+            return CallbackStats(
+                queue_depth=self._queue.qsize(),
+                enqueued=self._enqueued,
+                dropped=self._dropped,
+                delivered=self._delivered,
+                failed=self._failed,
+                retries=self._retries,
+                latency_total=self._latency_total,
+                latency_max=self._latency_max,
+            )
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            # threads and connections don't survive a fork, so start over in the new process.
+            self._sessions = {}
+            for i in range(self.concurrency):
+                threading.Thread(target=self._work, name=f"callback-{i}", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _session(self, url: str) -> requests.Session:
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = session
+        return session
+
+    def _work(self) -> None:
+        while True:
+            callback = self._queue.get()
+            try:
+                self._deliver(callback)
+            except Exception as ex:  # pylint: disable=broad-except
+                log.exception(f"Unexpected error delivering callback to {callback.url}: {ex}")
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, callback: Callback) -> None:
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                with self._lock:
+                    self._retries += 1
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+
+            try:
+                response = self._session(callback.url).post(callback.url, data=callback.data, timeout=self.timeout)
+            except requests.exceptions.RequestException as ex:
+                log.warning(f"Callback to {callback.url} failed, check that the callback service is running: {ex}")
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES:
+                log.warning(f"Callback to {callback.url} failed with status {response.status_code}")
+                continue
+
+            latency = time.monotonic() - callback.enqueued_at
+            with self._lock:
+                self._delivered += 1
+                self._latency_total += latency
+                self._latency_max = max(self._latency_max, latency)
+            return
+
+        with self._lock:
+            self._failed += 1
+        log.warning(f"Giving up on callback to {callback.url} after {self.max_retries + 1} attempts")
+
+
+callback_dispatcher = CallbackDispatcher(
+    concurrency=settings.callback_concurrency,
+    queue_size=settings.callback_queue_size,
+    max_retries=settings.callback_max_retries,
+    retry_backoff=settings.callback_retry_backoff,
+    timeout=settings.callback_timeout,
+)
+
+
+@metrics.stats_collector.register
+def _callback_metrics() -> Iterator[metrics.Metric]:
+    stats = callback_dispatcher.stats()
+    yield metrics.gauge("reflector_callback_queue_depth", "Callbacks waiting to be delivered.", stats.queue_depth)
+    yield metrics.counter("reflector_callbacks_enqueued", "Callbacks queued for delivery.", stats.enqueued)
+    yield metrics.counter("reflector_callbacks_dropped", "Callbacks dropped because the queue was full.", stats.dropped)
+    yield metrics.counter("reflector_callbacks_delivered", "Callbacks delivered.", stats.delivered)
+    yield metrics.counter("reflector_callbacks_failed", "Callbacks given up on after every retry.", stats.failed)
+    yield metrics.counter("reflector_callback_retries", "Callback delivery attempts that were retries.", stats.retries)
+    yield metrics.counter(
+        "reflector_callback_latency_seconds",
+        "Total time between queueing and delivering callbacks.",
+        stats.latency_total,
+    )
+    yield metrics.gauge(
+        "reflector_callback_latency_max_seconds",
+        "Longest time between queueing and delivering a callback.",
+        stats.latency_max,
+    )
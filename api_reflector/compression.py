@@ -0,0 +1,134 @@
+"""
+Compresses mock response bodies and answers conditional requests.
+
+Bodies are compressed with gzip or deflate when the client's `Accept-Encoding` allows it. Compressed variants of
+static responses are cached in memory, keyed by response id and content hash, so each is only compressed once per
+process. Every successful non-streamed response carries a strong ETag, and a GET or HEAD request whose `If-None-Match`
+matches it gets an empty 304 response instead of the body.
+"""
+import gzip
+import threading
+import zlib
+from typing import Mapping, Optional, Union
+
+from cachetools import LRUCache
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header, parse_etags
+from werkzeug.wrappers import Response
+
+from api_reflector.snapshot import ResponseSnapshot, make_etag
+from settings import settings
+
+# supported content codings, in order of preference.
+ENCODINGS = ("gzip", "deflate")
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Returns the preferred content coding accepted by the client, or None if the body should be sent as-is.
+    """
+    if not accept_encoding:
+        return None
+    return parse_accept_header(accept_encoding).best_match(ENCODINGS)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """
+    Compresses the given body with the given content coding.
+    """
+    if encoding == "gzip":
+        # a fixed mtime keeps the output, and so the cached variant, the same every time.
+        return gzip.compress(data, compresslevel=settings.compression_level, mtime=0)
+    return zlib.compress(data, settings.compression_level)
+
+
+class CompressionCache:
+    """
+    A bounded LRU cache of compressed static bodies, limited by their total size in bytes.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self._bodies: LRUCache[tuple[int, str, str], bytes] = LRUCache(maxsize=max_bytes, getsizeof=len)
+        self._lock = threading.Lock()
+
+    def get(self, response: ResponseSnapshot, etag: str, encoding: str) -> bytes:
+        """
+        Returns the static body of the given response compressed with the given content coding.
+        """
+        assert response.static_body is not None, "only static bodies can be cached"
+
+        key = (response.id, etag, encoding)
+        with self._lock:
+            data = self._bodies.get(key)
+        if data is not None:
+            return data
+
+        data = compress(response.static_body, encoding)
+        with self._lock:
+            try:
+                self._bodies[key] = data
+            except ValueError:
+                # bodies bigger than the whole cache are compressed every time.
+                pass
+        return data
+
+    def clear(self) -> None:
+        """
+        Removes every cached body.
+        """
+        with self._lock:
+            self._bodies.clear()
+
+
+compression_cache = CompressionCache(settings.compression_cache_size)
+
+
+# methods whose requests can be answered with 304 Not Modified.
+CONDITIONAL_METHODS = frozenset(("GET", "HEAD"))
+
+
+def build_response(
+    response: ResponseSnapshot,
+    body: Union[bytes, str],
+    method: str,
+    headers: Union[Headers, Mapping[str, str]],
+) -> Response:
+    """
+    Builds the HTTP response for the given rendered or static body, compressing it and answering conditional requests
+    according to the given request method & headers.
+    """
+    data = body.encode() if isinstance(body, str) else body
+
+    encoding = None
+    if settings.compression_enabled and len(data) >= settings.compression_min_size:
+        encoding = negotiate(headers.get("Accept-Encoding"))
+
+    if response.static_etag is not None:
+        etag = response.static_etag
+    else:
+        etag = make_etag(data)
+    if encoding is not None:
+        # each content coding is a different representation, so it needs its own strong etag.
+        etag = f"{etag}-{encoding}"
+
+    # If-None-Match uses the weak comparison, so a weakened copy of our etag from a client or proxy still matches.
+    if (
+        method in CONDITIONAL_METHODS
+        and 200 <= response.status_code < 300
+        and parse_etags(headers.get("If-None-Match")).contains_weak(etag)
+    ):
+        result = Response(status=304)
+    else:
+        if encoding is not None:
+            if response.static_body is not None and response.static_etag is not None:
+                data = compression_cache.get(response, response.static_etag, encoding)
+            else:
+                data = compress(data, encoding)
+        result = Response(data, status=response.status_code, mimetype=response.content_type)
+        if encoding is not None:
+            result.headers["Content-Encoding"] = encoding
+
+    result.set_etag(etag)
+    if settings.compression_enabled:
+        result.vary.add("Accept-Encoding")
+    return result
@@ -0,0 +1,420 @@
+# pydantic models are inherently just data structures, so pylint's warning here isn't particularly useful.
+# pylint: disable=too-few-public-methods
+
+"""
+Imports and exports the mock configuration as JSON or YAML documents.
+
+A document lists tags and endpoints, with each endpoint's responses, rules and actions nested inside it. Imports upsert
+endpoints by method and path: an endpoint that already exists is renamed and has its responses replaced by the
+imported ones, and any other endpoint is created. Everything is written with bulk inserts in a single transaction.
+
+Exports are streamed a batch of endpoints at a time, so the whole configuration never needs to be held in memory.
+
+Usage:
+
+    api-reflector-config export --output mocks.yaml
+    api-reflector-config import mocks.yaml
+"""
+import argparse
+import json
+import sys
+from typing import Any, Iterable, Iterator, NamedTuple, Optional, Union
+
+import yaml
+from pydantic import BaseModel, validator
+from sqlalchemy import Table, create_engine, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+
+from api_reflector import models, notifications
+from api_reflector.actions import Action
+from api_reflector.endpoint import Method, ensure_leading_slash
+from api_reflector.rules_engine import Operator
+from settings import settings
+
+FORMATS = ("json", "yaml")
+MIMETYPES = {"json": "application/json", "yaml": "application/yaml"}
+
+endpoint_table = models.Endpoint.__table__
+response_table = models.Response.__table__
+rule_table = models.Rule.__table__
+action_table = models.Action.__table__
+tag_table = models.Tag.__table__
+response_tag_table = models.response_tag
+
+
+class RuleConfig(BaseModel):
+    """
+    An imported or exported rule.
+    """
+
+    operator: Operator
+    arguments: list[str] = []
+
+
+class ActionConfig(BaseModel):
+    """
+    An imported or exported action.
+    """
+
+    action: Action
+    arguments: list[str] = []
+
+
+class ResponseConfig(BaseModel):
+    """
+    An imported or exported response.
+    """
+
+    name: str
+    status_code: int = 200
+    content_type: str = "application/json"
+    content: str = "{}"
+    is_active: bool = True
+    stream: bool = False
+    tags: list[str] = []
+    rules: list[RuleConfig] = []
+    actions: list[ActionConfig] = []
+
+
+class EndpointConfig(BaseModel):
+    """
+    An imported or exported endpoint and its responses.
+    """
+
+    name: str
+    method: Method
+    path: str
+    responses: list[ResponseConfig] = []
+
+    @validator("path")
+    @classmethod
+    def validate_path(cls, value: str) -> str:
+        """
+        Paths are stored with a leading slash. Empty paths are rejected.
+        """
+        if not value.strip():
+            raise ValueError("path must not be empty")
+        return ensure_leading_slash(value)
+
+
+class MockConfig(BaseModel):
+    """
+    A whole imported or exported configuration.
+    """
+
+    tags: list[str] = []
+    endpoints: list[EndpointConfig] = []
+
+    @validator("endpoints")
+    @classmethod
+    def validate_unique_endpoints(cls, value: list[EndpointConfig]) -> list[EndpointConfig]:
+        """
+        Endpoints are upserted by method and path, so each method and path can only appear once.
+        """
+        seen = set()
+        for endpoint in value:
+            key = (endpoint.method, endpoint.path)
+            if key in seen:
+                raise ValueError(f"Endpoint {endpoint.method} {endpoint.path} appears more than once")
+            seen.add(key)
+        return value
+
+
+class ImportSummary(NamedTuple):
+    """
+    Counts of what an import wrote.
+    """
+
+    endpoints_created: int
+    endpoints_updated: int
+    responses: int
+    rules: int
+    actions: int
+
+
+def format_for_path(path: str) -> str:
+    """
+    Returns the document format implied by the given file name.
+    """
+    return "yaml" if path.endswith((".yaml", ".yml")) else "json"
+
+
+def parse(data: Union[str, bytes], fmt: str) -> MockConfig:
+    """
+    Parses and validates a configuration document.
+    Raises a ValueError if the document is invalid.
+    """
+    if fmt == "yaml":
+        try:
+            document = yaml.safe_load(data)
+        except yaml.YAMLError as ex:
+            raise ValueError(f"Invalid YAML: {ex}") from ex
+    else:
+        document = json.loads(data)
+
+    return MockConfig.parse_obj(document or {})
+
+
+def _allocate_ids(connection: Connection, table: str, count: int) -> list[int]:
+    """
+    Reserves the given number of primary keys from a table's sequence, so that rows referring to them can be inserted
+    in bulk without reading ids back.
+    """
+    return (
+        connection.execute(
+            text(f"SELECT nextval(pg_get_serial_sequence('{table}', 'id')) FROM generate_series(1, :count)"),
+            count=count,
+        )
+        .scalars()
+        .all()
+    )
+
+
+def _upsert_tags(connection: Connection, names: set[str]) -> dict[str, int]:
+    if not names:
+        return {}
+
+    connection.execute(
+        insert(tag_table).values([{"name": name} for name in sorted(names)]).on_conflict_do_nothing(),
+    )
+    rows = connection.execute(select(tag_table.c.id, tag_table.c.name).where(tag_table.c.name.in_(names)))
+    return {name: tag_id for tag_id, name in rows}
+
+
+def _upsert_endpoints(connection: Connection, endpoints: list[EndpointConfig]) -> dict[tuple[Method, str], int]:
+    if not endpoints:
+        return {}
+
+    stmt = insert(endpoint_table).values(
+        [{"name": endpoint.name, "method": endpoint.method, "path": endpoint.path} for endpoint in endpoints]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[endpoint_table.c.method, endpoint_table.c.path],
+        set_={"name": stmt.excluded.name},
+    ).returning(endpoint_table.c.id, endpoint_table.c.method, endpoint_table.c.path)
+    return {(method, path): endpoint_id for endpoint_id, method, path in connection.execute(stmt)}
+
+
+def _delete_responses(connection: Connection, endpoint_ids: Iterable[int]) -> None:
+    response_ids = select(response_table.c.id).where(response_table.c.endpoint_id.in_(endpoint_ids))
+    for table in (response_tag_table, rule_table, action_table):
+        connection.execute(table.delete().where(table.c.response_id.in_(response_ids)))
+    connection.execute(response_table.delete().where(response_table.c.endpoint_id.in_(endpoint_ids)))
+
+
+def import_config(connection: Connection, config: MockConfig) -> ImportSummary:
+    """
+    Upserts the given configuration into the database in a single transaction.
+    """
+    responses = [(endpoint, response) for endpoint in config.endpoints for response in endpoint.responses]
+
+    with connection.begin():
+        # serialise imports, so that two imports of the same endpoint can't interleave their responses.
+        connection.execute(text("LOCK TABLE endpoint IN SHARE ROW EXCLUSIVE MODE"))
+
+        existing = {
+            (method, path): endpoint_id
+            for endpoint_id, method, path in connection.execute(
+                select(endpoint_table.c.id, endpoint_table.c.method, endpoint_table.c.path)
+            )
+        }
+        updated_ids = [
+            existing[endpoint.method, endpoint.path]
+            for endpoint in config.endpoints
+            if (endpoint.method, endpoint.path) in existing
+        ]
+        if updated_ids:
+            _delete_responses(connection, updated_ids)
+
+        tag_ids = _upsert_tags(
+            connection, set(config.tags) | {tag for _, response in responses for tag in response.tags}
+        )
+        endpoint_ids = _upsert_endpoints(connection, config.endpoints)
+        response_ids = _allocate_ids(connection, "response", len(responses))
+
+        # rows are inserted in this order, so that referenced rows always exist first.
+        rows: dict[Table, list[dict[str, Any]]] = {
+            response_table: [],
+            rule_table: [],
+            action_table: [],
+            response_tag_table: [],
+        }
+        for response_id, (endpoint, response) in zip(response_ids, responses):
+            rows[response_table].append(
+                {
+                    "id": response_id,
+                    "endpoint_id": endpoint_ids[endpoint.method, endpoint.path],
+                    **response.dict(include={"name", "status_code", "content_type", "content", "is_active", "stream"}),
+                }
+            )
+            rows[rule_table] += [{"response_id": response_id, **rule.dict()} for rule in response.rules]
+            rows[action_table] += [{"response_id": response_id, **action.dict()} for action in response.actions]
+            rows[response_tag_table] += [{"response_id": response_id, "tag_id": tag_ids[tag]} for tag in response.tags]
+
+        for table, table_rows in rows.items():
+            if table_rows:
+                connection.execute(table.insert(), table_rows)
+
+    return ImportSummary(
+        endpoints_created=len(config.endpoints) - len(updated_ids),
+        endpoints_updated=len(updated_ids),
+        responses=len(rows[response_table]),
+        rules=len(rows[rule_table]),
+        actions=len(rows[action_table]),
+    )
+
+
+def _load_tags(connection: Connection) -> list[str]:
+    return connection.execute(select(tag_table.c.name).order_by(tag_table.c.name)).scalars().all()
+
+
+def _load_responses(connection: Connection, endpoint_ids: list[int]) -> dict[int, list[dict[str, Any]]]:
+    """
+    Loads the responses of the given endpoints with their rules, actions and tags, grouped by endpoint id.
+    """
+    responses = connection.execute(
+        select(response_table).where(response_table.c.endpoint_id.in_(endpoint_ids)).order_by(response_table.c.id)
+    ).fetchall()
+    response_ids = [response.id for response in responses]
+
+    rules: dict[int, list[dict[str, Any]]] = {response_id: [] for response_id in response_ids}
+    for rule in connection.execute(
+        select(rule_table).where(rule_table.c.response_id.in_(response_ids)).order_by(rule_table.c.id)
+    ):
+        rules[rule.response_id].append({"operator": rule.operator.value, "arguments": list(rule.arguments)})
+
+    actions: dict[int, list[dict[str, Any]]] = {response_id: [] for response_id in response_ids}
+    for action in connection.execute(
+        select(action_table).where(action_table.c.response_id.in_(response_ids)).order_by(action_table.c.id)
+    ):
+        actions[action.response_id].append({"action": action.action.value, "arguments": list(action.arguments)})
+
+    tags: dict[int, list[str]] = {response_id: [] for response_id in response_ids}
+    for response_id, name in connection.execute(
+        select(response_tag_table.c.response_id, tag_table.c.name)
+        .join(tag_table, tag_table.c.id == response_tag_table.c.tag_id)
+        .where(response_tag_table.c.response_id.in_(response_ids))
+        .order_by(tag_table.c.name)
+    ):
+        tags[response_id].append(name)
+
+    grouped: dict[int, list[dict[str, Any]]] = {endpoint_id: [] for endpoint_id in endpoint_ids}
+    for response in responses:
+        grouped[response.endpoint_id].append(
+            {
+                "name": response.name,
+                "status_code": response.status_code,
+                "content_type": response.content_type,
+                "content": response.content,
+                "is_active": response.is_active,
+                "stream": response.stream,
+                "tags": tags[response.id],
+                "rules": rules[response.id],
+                "actions": actions[response.id],
+            }
+        )
+    return grouped
+
+
+def _load_endpoints(connection: Connection, batch_size: int) -> Iterator[dict[str, Any]]:
+    """
+    Yields every endpoint with its responses, loading a batch of endpoints at a time.
+    """
+    last_id = 0
+    while True:
+        endpoints = connection.execute(
+            select(endpoint_table).where(endpoint_table.c.id > last_id).order_by(endpoint_table.c.id).limit(batch_size)
+        ).fetchall()
+        if not endpoints:
+            return
+        last_id = endpoints[-1].id
+
+        responses = _load_responses(connection, [endpoint.id for endpoint in endpoints])
+        for endpoint in endpoints:
+            yield {
+                "name": endpoint.name,
+                "method": endpoint.method.value,
+                "path": endpoint.path,
+                "responses": responses[endpoint.id],
+            }
+
+
+def dump(fmt: str, tags: list[str], endpoints: Iterable[dict[str, Any]]) -> Iterator[str]:
+    """
+    Serialises a configuration document a piece at a time.
+    """
+    if fmt == "yaml":
+        yield yaml.safe_dump({"tags": tags}, sort_keys=False)
+        empty = True
+        for endpoint in endpoints:
+            if empty:
+                yield "endpoints:\n"
+                empty = False
+            yield yaml.safe_dump([endpoint], sort_keys=False)
+        if empty:
+            yield "endpoints: []\n"
+    else:
+        yield f'{{"tags": {json.dumps(tags)}, "endpoints": ['
+        for i, endpoint in enumerate(endpoints):
+            yield f"{', ' if i else ''}{json.dumps(endpoint)}"
+        yield "]}\n"
+
+
+def export_config(connection: Connection, fmt: str, batch_size: int = 500) -> Iterator[str]:
+    """
+    Streams the whole configuration from the database as a document in the given format.
+    """
+    return dump(fmt, _load_tags(connection), _load_endpoints(connection, batch_size))
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Imports or exports the mock configuration.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="write the configuration to a file or stdout")
+    export_parser.add_argument("--output", "-o", help="file to write to, defaults to stdout")
+    export_parser.add_argument("--format", "-f", choices=FORMATS, help="defaults to the output file's extension")
+
+    import_parser = subparsers.add_parser("import", help="upsert the configuration from a file or stdin")
+    import_parser.add_argument("file", help="file to read from, or - for stdin")
+    import_parser.add_argument("--format", "-f", choices=FORMATS, help="defaults to the input file's extension")
+
+    args = parser.parse_args(argv)
+
+    engine = create_engine(settings.database_url, **settings.postgres_engine_options)
+    try:
+        with engine.connect() as connection:
+            if args.command == "export":
+                fmt = args.format or format_for_path(args.output or "")
+                if args.output:
+                    with open(args.output, "w", encoding="utf-8") as output:
+                        output.writelines(export_config(connection, fmt))
+                else:
+                    sys.stdout.writelines(export_config(connection, fmt))
+                return 0
+
+            fmt = args.format or format_for_path(args.file)
+            if args.file == "-":
+                data = sys.stdin.read()
+            else:
+                with open(args.file, encoding="utf-8") as source:
+                    data = source.read()
+
+            try:
+                config = parse(data, fmt)
+            except ValueError as ex:
+                print(f"Invalid configuration: {ex}", file=sys.stderr)
+                return 1
+
+            summary = import_config(connection, config)
+            if settings.config_notifications_enabled:
+                with connection.begin():
+                    notifications.notify(connection)
+            print(", ".join(f"{name.replace('_', ' ')}: {count}" for name, count in summary._asdict().items()))
+            return 0
+    finally:
+        engine.dispose()
@@ -1,9 +1,39 @@
 """
 Creates the flask-sqlalchemy instance and aliases its Model and session properties.
+Also provides the engine used for the read-only queries of the mock serving path.
 """
+import threading
+from typing import Optional
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+from settings import settings
 
 sqla = SQLAlchemy()
 Model = sqla.Model
 session = sqla.session
+
+_replica_engine: Optional[Engine] = None
+_replica_lock = threading.Lock()
+
+
+def read_engine() -> Engine:
+    """
+    Returns the engine for the read-only queries of the mock serving path.
+    If `postgres_replica_dsn` is set, this is a separate engine with its own pool connected to the replica. Otherwise
+    it's the primary engine, which requires an application context.
+    """
+    global _replica_engine  # pylint: disable=global-statement
+
+    if settings.postgres_replica_dsn is None:
+        return sqla.engine
+
+    if _replica_engine is None:
+        with _replica_lock:
+            if _replica_engine is None:
+                _replica_engine = create_engine(
+                    settings.postgres_replica_dsn, **settings.postgres_replica_engine_options
+                )
+    return _replica_engine
@@ -0,0 +1,37 @@
+"""
+Support for serving with gunicorn's gevent worker class.
+
+With `--worker-class=gevent`, each worker serves many requests concurrently on green threads. Gunicorn monkey-patches
+the standard library before the app is loaded, so a DELAY action's `time.sleep` parks its request on a gevent timer
+instead of pinning a whole worker. psycopg2 is a C extension and can't be monkey-patched, so this module makes it
+cooperative with psycogreen as well.
+
+Requires the `gevent` extra.
+"""
+from api_reflector.reporting import get_logger
+
+try:
+    from gevent import monkey
+    from psycogreen.gevent import patch_psycopg
+except ImportError:
+    monkey = None
+
+log = get_logger(__name__)
+
+
+def is_monkey_patched() -> bool:
+    """
+    Returns true if the standard library has been monkey-patched by gevent.
+    """
+    return monkey is not None and monkey.is_module_patched("time")
+
+
+def patch() -> None:
+    """
+    Makes psycopg2 cooperative if we're running on a gevent worker. Does nothing otherwise.
+    """
+    if not is_monkey_patched():
+        return
+
+    log.debug("Running on gevent, patching psycopg2.")
+    patch_psycopg()
@@ -0,0 +1,238 @@
+"""
+Records every mock request in a journal, for finding out what a misbehaving mock received and how it responded.
+
+Requests are recorded into a bounded in-memory buffer, and a background thread writes them to the `journal_entry`
+table in batches, so serving a mock never waits on the database. If the buffer fills up faster than it can be
+written, the oldest entries are dropped and counted.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Mapping, NamedTuple, Optional
+
+from flask import Flask, current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from api_reflector import db, metrics, models
+from api_reflector.reporting import get_logger
+from settings import settings
+
+log = get_logger(__name__)
+
+
+class MockHit(NamedTuple):
+    """
+    A request received by a mock endpoint, and how it was served.
+    """
+
+    recorded_at: datetime
+    method: str
+    path: str
+    headers: Mapping[str, str]
+    body: str
+    endpoint_id: Optional[int]
+    response_id: Optional[int]
+    status_code: int
+    duration: float
+    timings: Mapping[str, float]
+
+
+class Trace:  # pylint: disable=too-few-public-methods
+    """
+    Collects what happened while serving a mock request, to be recorded in the journal afterwards.
+    """
+
+    __slots__ = ("endpoint_id", "response_id", "timings")
+
+    def __init__(self) -> None:
+        self.endpoint_id: Optional[int] = None
+        self.response_id: Optional[int] = None
+        self.timings: dict[str, float] = {}
+
+
+class JournalStats(NamedTuple):
+    """
+    Counters describing the journal's activity since it was created.
+    """
+
+    buffered: int
+    recorded: int
+    dropped: int
+    written: int
+    failed: int
+
+
+class RequestJournal:  # pylint: disable=too-many-instance-attributes
+    """
+    A bounded buffer of mock hits and the thread that writes them to the database.
+    The thread is started on first use in each process, so the journal is safe to create before gunicorn forks.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        capacity: int,
+        batch_size: int,
+        flush_interval: float,
+        retention: Optional[float],
+        max_body_length: int,
+        cleanup_interval: float = 60,
+    ) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self.max_body_length = max_body_length
+        self.cleanup_interval = cleanup_interval
+
+        self._buffer: deque[MockHit] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid: Optional[int] = None
+        self._app: Optional[Flask] = None
+        self._last_cleanup = 0.0
+
+        self._recorded = 0
+        self._dropped = 0
+        self._written = 0
+        self._failed = 0
+
+    def record(self, hit: MockHit) -> None:
+        """
+        Adds a mock hit to the journal, dropping the oldest unwritten hit if the buffer is full.
+        Must be called with a flask app context.
+        """
+        self._ensure_started()
+
+        if len(hit.body) > self.max_body_length:
+            hit = hit._replace(body=hit.body[: self.max_body_length])
+
+        with self._lock:
+            dropped = len(self._buffer) == self._buffer.maxlen
+            self._buffer.append(hit)
+            self._recorded += 1
+            if dropped:
+                self._dropped += 1
+            buffered = len(self._buffer)
+
+        if dropped:
+            metrics.journal_dropped.inc()
+        if buffered >= self.batch_size:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """
+        Writes every buffered hit to the database. Returns the number of hits written.
+        """
+        written = 0
+        with self._flush_lock:
+            while batch := self._take_batch():
+                try:
+                    self._write(batch)
+                except SQLAlchemyError as ex:
+                    with self._lock:
+                        self._failed += len(batch)
+                    log.warning(f"Failed to write {len(batch)} journal entries: {ex}")
+                    break
+
+                written += len(batch)
+                with self._lock:
+                    self._written += len(batch)
+
+        return written
+
+    def stats(self) -> JournalStats:
+        """
+        Returns the journal's current counters.
+        """
+        with self._lock:
+            return JournalStats(
+                buffered=len(self._buffer),
+                recorded=self._recorded,
+                dropped=self._dropped,
+                written=self._written,
+                failed=self._failed,
+            )
+
+    def _ensure_started(self) -> None:
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+
+        with self._lock:
+            if self._pid != pid:
+                self._start(pid)
+
+    def _start(self, pid: int) -> None:
+        # the writer thread needs an app context to reach the database.
+        self._app = current_app._get_current_object()  # type: ignore  # pylint: disable=protected-access
+        threading.Thread(target=self._work, name="journal", daemon=True).start()
+        if self._pid is None:
+            atexit.register(self.flush)
+        self._pid = pid
+
+    def _work(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as ex:  # pylint: disable=broad-except
+                log.exception(f"Unexpected error writing the journal: {ex}")
+
+    def _take_batch(self) -> list[MockHit]:
+        with self._lock:
+            return [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+
+    def _write(self, batch: list[MockHit]) -> None:
+        assert self._app is not None, "journal has not been started"
+        table = models.JournalEntry.__table__
+
+        with self._app.app_context(), db.sqla.engine.begin() as connection:
+            connection.execute(table.insert(), [hit._asdict() for hit in batch])
+
+            now = time.monotonic()
+            if self.retention is not None and now - self._last_cleanup > self.cleanup_interval:
+                self._last_cleanup = now
+                cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.retention)
+                connection.execute(table.delete().where(table.c.recorded_at < cutoff))
+
+
+REDACTED = "[redacted]"
+
+
+def make_hit(  # pylint: disable=too-many-arguments
+    method: str, path: str, headers: Any, body: bytes, status_code: int, duration: float, trace: Trace
+) -> MockHit:
+    """
+    Builds a mock hit from a served request and its trace.
+    The values of the headers in `journal_redacted_headers` are redacted, and the body is cut down to
+    `journal_max_body_length` before it's decoded.
+    """
+    return MockHit(
+        recorded_at=datetime.now(timezone.utc),
+        method=method,
+        path=path,
+        headers={
+            name: REDACTED if name.lower() in settings.journal_redacted_headers else value
+            for name, value in dict(headers).items()
+        },
+        # a character takes at least one byte, so this never cuts off anything that would be kept.
+        body=body[: settings.journal_max_body_length].decode("utf-8", errors="replace"),
+        endpoint_id=trace.endpoint_id,
+        response_id=trace.response_id,
+        status_code=status_code,
+        duration=duration,
+        timings=trace.timings,
+    )
+
+
+request_journal = RequestJournal(
+    capacity=settings.journal_capacity,
+    batch_size=settings.journal_batch_size,
+    flush_interval=settings.journal_flush_interval,
+    retention=settings.journal_retention,
+    max_body_length=settings.journal_max_body_length,
+)
@@ -0,0 +1,112 @@
+"""
+Serves mocks from a JSON or YAML manifest file instead of the database.
+
+The manifest uses the same format as `api-reflector-config export`. It's loaded into memory when the app is created,
+and a background thread polls the file for changes. Each change is loaded in full and swapped in atomically; if the
+new manifest is invalid, the previous configuration is kept and a warning is logged.
+"""
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from api_reflector import config_io, models
+from api_reflector.reporting import get_logger
+from api_reflector.snapshot import EndpointSnapshot, config_store, snapshot_endpoint
+
+log = get_logger(__name__)
+
+
+def build_endpoints(config: config_io.MockConfig) -> dict[int, EndpointSnapshot]:
+    """
+    Builds endpoint snapshots from a parsed manifest. Ids are assigned in the order the manifest lists things.
+    """
+    endpoints = {}
+    response_id = 0
+    for endpoint_id, endpoint_config in enumerate(config.endpoints, start=1):
+        # transient models are never added to a session, they're only used to build the snapshots.
+        endpoint = models.Endpoint(
+            id=endpoint_id, name=endpoint_config.name, method=endpoint_config.method, path=endpoint_config.path
+        )
+        for response_config in endpoint_config.responses:
+            response_id += 1
+            # snapshots order rules & actions by id, so they're numbered in the order the manifest lists them.
+            models.Response(
+                id=response_id,
+                endpoint=endpoint,
+                rules=[models.Rule(id=index, **rule.dict()) for index, rule in enumerate(response_config.rules)],
+                actions=[
+                    models.Action(id=index, **action.dict()) for index, action in enumerate(response_config.actions)
+                ],
+                **response_config.dict(
+                    include={"name", "status_code", "content_type", "content", "is_active", "stream"}
+                ),
+            )
+        endpoints[endpoint_id] = snapshot_endpoint(endpoint)
+    return endpoints
+
+
+def load_manifest(path: Path) -> dict[int, EndpointSnapshot]:
+    """
+    Loads endpoint snapshots from the given manifest file.
+    Raises an OSError if the file can't be read, or a ValueError if it isn't a valid manifest.
+    """
+    return build_endpoints(config_io.parse(path.read_bytes(), config_io.format_for_path(path.name)))
+
+
+class ManifestWatcher:
+    """
+    Publishes the configuration in a manifest file, and again whenever the file changes.
+    """
+
+    def __init__(self, path: Path, poll_interval: float) -> None:
+        self.path = path
+        self.poll_interval = poll_interval
+        self._stat: Optional[tuple[int, int]] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def reload(self) -> bool:
+        """
+        Publishes the manifest if it changed since it was last published. Returns true if it was published.
+        Raises an OSError or ValueError if the manifest can't be loaded, in which case the current configuration is
+        left as it is.
+        """
+        stat = self.path.stat()
+        # the file is stat'ed before it's read, so a change made while reading is picked up by the next reload.
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._stat:
+            return False
+
+        # recorded before loading, so that an invalid manifest is only reported once rather than on every poll.
+        self._stat = signature
+        endpoints = load_manifest(self.path)
+        config_store.publish(endpoints)
+        log.info("Loaded %d endpoints from manifest `%s`.", len(endpoints), self.path)
+        return True
+
+    def start(self) -> None:
+        """
+        Starts polling the manifest for changes in a background thread.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._work, name="manifest", daemon=True)
+            self._thread.start()
+
+    def _work(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.reload()
+            except Exception as ex:  # pylint: disable=broad-except
+                log.warning(f"Failed to reload manifest `{self.path}`, keeping the previous configuration: {ex}")
+
+
+def serve_manifest(path: Path, poll_interval: float) -> ManifestWatcher:
+    """
+    Publishes the configuration in the given manifest file and starts watching it for changes.
+    Raises an OSError or ValueError if the manifest can't be loaded.
+    """
+    watcher = ManifestWatcher(path, poll_interval)
+    watcher.reload()
+    watcher.start()
+    return watcher
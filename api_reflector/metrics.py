@@ -0,0 +1,165 @@
+"""
+Defines the prometheus metrics exposed on `/metrics`.
+
+When running multiple gunicorn workers, set `PROMETHEUS_MULTIPROC_DIR` to an empty directory before starting gunicorn.
+Each worker then writes its metrics to that directory and `/metrics` aggregates them across all workers. The
+`child_exit` hook in `gunicorn.conf.py` cleans up after workers that exit.
+
+Components that keep their own counters, such as the callback dispatcher, register a source with `stats_collector`
+instead. Sources are read whenever metrics are collected, so serving a mock never updates these metrics. They describe
+the process that serves `/metrics`, which is one of the workers when running more than one.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector
+
+# the endpoint label used for requests that didn't match any endpoint.
+UNMATCHED = "unmatched"
+
+PHASE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+mock_requests = Counter(
+    "reflector_mock_requests_total",
+    "Mock requests served, by matched endpoint, method and status code.",
+    ["endpoint", "method", "status"],
+)
+mock_request_duration = Histogram(
+    "reflector_mock_request_duration_seconds",
+    "Time taken to serve mock requests, by matched endpoint.",
+    ["endpoint"],
+)
+phase_duration = Histogram(
+    "reflector_mock_phase_duration_seconds",
+    "Time taken by each phase of serving a mock request.",
+    ["phase"],
+    buckets=PHASE_BUCKETS,
+)
+
+journal_dropped = Counter(
+    "reflector_journal_dropped_total",
+    "Journal entries dropped because the journal buffer was full.",
+)
+
+log_dropped = Counter(
+    "reflector_log_dropped_total",
+    "Log records dropped because the logging queue was full.",
+)
+
+# returns the current metrics of a component.
+StatsSource = Callable[[], Iterable[Metric]]
+
+
+class StatsCollector(Collector):
+    """
+    Collects metrics from the sources registered with it.
+    """
+
+    def __init__(self) -> None:
+        self._sources: list[StatsSource] = []
+
+    def register(self, source: StatsSource) -> StatsSource:
+        """
+        Adds a source of metrics. Returns the source, so that this can be used as a decorator.
+        """
+        self._sources.append(source)
+        return source
+
+    def collect(self) -> Iterator[Metric]:
+        for source in self._sources:
+            yield from source()
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def gauge(name: str, documentation: str, value: float) -> Metric:
+    """
+    Returns a gauge with the given value, for use in a stats source.
+    """
+    return GaugeMetricFamily(name, documentation, value=value)
+
+
+def counter(name: str, documentation: str, value: float) -> Metric:
+    """
+    Returns a counter with the given value, for use in a stats source. `_total` is added to the name.
+    """
+    return CounterMetricFamily(name, documentation, value=value)
+
+
+PHASES = ("match_endpoint", "find_best_response", "render", "execute_actions")
+
+# children are bound up front so that the hot path doesn't need to look up labels.
+phase_durations = {phase: phase_duration.labels(phase=phase) for phase in PHASES}
+
+
+@contextmanager
+def timed(phase: str, timings: Optional[dict[str, float]] = None) -> Iterator[None]:
+    """
+    Times the enclosed block as the given phase of serving a mock request.
+    If a timings dict is given, the duration in seconds is also recorded in it.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        phase_durations[phase].observe(duration)
+        if timings is not None:
+            timings[phase] = duration
+
+
+def endpoint_label(endpoint: Any) -> str:
+    """
+    Returns the label used to identify the given endpoint in metrics.
+    """
+    return f"{endpoint.method} {endpoint.path}"
+
+
+def observe_request(endpoint: str, method: str, status: int, duration: float) -> None:
+    """
+    Records a served mock request.
+    """
+    mock_requests.labels(endpoint=endpoint, method=method, status=str(status)).inc()
+    mock_request_duration.labels(endpoint=endpoint).observe(duration)
+
+
+def is_multiprocess() -> bool:
+    """
+    Returns true if metrics are being collected from multiple processes.
+    """
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+def generate() -> tuple[bytes, str]:
+    """
+    Returns the current metrics in the prometheus text format, and its content type.
+    """
+    registry = REGISTRY
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(stats_collector)
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def child_exit(_server: Any, worker: Any) -> None:
+    """
+    Gunicorn server hook that removes the metrics of a worker that has exited.
+    """
+    if is_multiprocess():
+        multiprocess.mark_process_dead(worker.pid)
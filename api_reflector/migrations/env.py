@@ -16,7 +16,7 @@ from settings import settings
 logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
 
 config = context.config
-config.set_main_option("sqlalchemy.url", settings.postgres_dsn)
+config.set_main_option("sqlalchemy.url", settings.database_url)
 
 target_metadata = db.Model.metadata
 
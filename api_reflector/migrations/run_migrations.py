@@ -7,6 +7,9 @@ import os
 
 import alembic.config
 import fasteners
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, pool
 
 from settings import settings
 
@@ -16,6 +19,38 @@ alembic_ini = os.path.join(here, "alembic.ini")
 alembic_args = ["-c", alembic_ini, "upgrade", "head"]
 
 
+def is_at_head() -> bool:
+    """
+    Returns true if the database schema is already at the latest revision.
+    """
+    script = ScriptDirectory.from_config(alembic.config.Config(alembic_ini))
+    engine = create_engine(settings.database_url, poolclass=pool.NullPool)
+    try:
+        with engine.connect() as connection:
+            current_heads = MigrationContext.configure(connection).get_current_heads()
+    finally:
+        engine.dispose()
+
+    return set(current_heads) == set(script.get_heads())
+
+
+def upgrade_if_needed() -> bool:
+    """
+    Runs `alembic upgrade head` unless the database is already at head.
+    Returns true if migrations were run.
+    """
+    if is_at_head():
+        return False
+
+    with fasteners.InterProcessLock(settings.lockfile_path):
+        # another process may have migrated the database while we waited for the lock.
+        if is_at_head():
+            return False
+        alembic.config.main(argv=alembic_args)
+
+    return True
+
+
 def main():
     """
     Runs `alembic upgrade head`.
@@ -0,0 +1,32 @@
+"""add unlogged storage table
+
+Revision ID: 5c1f0e2a9d47
+Revises: bf9a283876e7
+Create Date: 2026-10-18 11:52:31.418205
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5c1f0e2a9d47"
+down_revision = "bf9a283876e7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "storage",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("value", sa.Text(), nullable=False),
+        sa.Column("expires_at", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+        prefixes=["UNLOGGED"],
+    )
+    op.create_index(op.f("ix_storage_expires_at"), "storage", ["expires_at"], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f("ix_storage_expires_at"), table_name="storage")
+    op.drop_table("storage")
@@ -0,0 +1,39 @@
+"""add journal entry table
+
+Revision ID: a3d81f6c2b10
+Revises: 5c1f0e2a9d47
+Create Date: 2026-10-18 14:07:12.530118
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a3d81f6c2b10"
+down_revision = "5c1f0e2a9d47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "journal_entry",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("recorded_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("method", sa.String(), nullable=False),
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("headers", sa.JSON(), nullable=False),
+        sa.Column("body", sa.Text(), nullable=False),
+        sa.Column("endpoint_id", sa.Integer(), nullable=True),
+        sa.Column("response_id", sa.Integer(), nullable=True),
+        sa.Column("status_code", sa.Integer(), nullable=False),
+        sa.Column("duration", sa.Float(), nullable=False),
+        sa.Column("timings", sa.JSON(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_journal_entry_recorded_at"), "journal_entry", ["recorded_at"], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f("ix_journal_entry_recorded_at"), table_name="journal_entry")
+    op.drop_table("journal_entry")
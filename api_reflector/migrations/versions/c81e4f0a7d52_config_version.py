@@ -0,0 +1,28 @@
+"""add configuration version
+
+Revision ID: c81e4f0a7d52
+Revises: e6b4c1d93f25
+Create Date: 2026-10-18 19:02:11.403512
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c81e4f0a7d52"
+down_revision = "e6b4c1d93f25"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "config_version",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade():
+    op.drop_table("config_version")
@@ -0,0 +1,23 @@
+"""add stream flag to responses
+
+Revision ID: e6b4c1d93f25
+Revises: a3d81f6c2b10
+Create Date: 2026-10-18 15:21:46.902311
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e6b4c1d93f25"
+down_revision = "a3d81f6c2b10"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("response", sa.Column("stream", sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    op.drop_column("response", "stream")
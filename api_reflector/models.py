@@ -8,9 +8,13 @@ from typing import Any, Mapping
 
 from sqlalchemy import (
     ARRAY,
+    JSON,
+    BigInteger,
     Boolean,
     Column,
+    DateTime,
     Enum,
+    Float,
     ForeignKey,
     Integer,
     String,
@@ -19,6 +23,7 @@ from sqlalchemy import (
     UniqueConstraint,
 )
 from sqlalchemy.orm import DeclarativeMeta, relationship
+from sqlalchemy.sql.expression import false
 
 from api_reflector import actions, db, endpoint, rules_engine
 from api_reflector.reporting import get_logger
@@ -77,6 +82,8 @@ class Response(Model):
     content = Column(Text, nullable=False, default="{}")
 
     is_active = Column(Boolean, nullable=False, default=True)
+    # if set, content is sent to the client as it is rendered instead of being rendered in full first.
+    stream = Column(Boolean, nullable=False, default=False, server_default=false())
 
     endpoint = relationship("Endpoint", back_populates="responses")
     rules = relationship("Rule", back_populates="response")
@@ -96,10 +103,10 @@ class Response(Model):
         """
         Executes all response actions for the given response.
         """
-        log.debug(f"Executing actions for response: {self}")
+        log.debug("Executing actions for response: %s", self)
 
         for action in self.actions:
-            log.debug(f"Executing action: {action}")
+            log.debug("Executing action: %s", action)
             actions.action_executors[action.action](*action.arguments, request=req_json, response=content)
 
 
@@ -174,3 +181,53 @@ class Tag(Model):
 
     def __str__(self) -> str:
         return f"{self.name}"
+
+
+# used by the postgres storage backend. unlogged, as stored values are short-lived and don't need to survive a crash.
+storage = Table(
+    "storage",
+    Model.metadata,
+    Column("name", String, primary_key=True),
+    Column("value", Text, nullable=False),
+    Column("expires_at", Float, nullable=False, index=True),
+    prefixes=["UNLOGGED"],
+)
+
+
+# a single row holding the configuration version, bumped by every configuration change notification. the row lock
+# taken by the bump keeps notifications in version order, so listeners can tell when they've missed one.
+config_version = Table(
+    "config_version",
+    Model.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("version", BigInteger, nullable=False),
+)
+
+
+class JournalEntry(Model):
+    """
+    Models a request received by a mock endpoint, as recorded by the request journal.
+    """
+
+    __tablename__ = "journal_entry"
+
+    id = Column(BigInteger, primary_key=True)
+
+    recorded_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    method = Column(String, nullable=False)
+    path = Column(String, nullable=False)
+    headers = Column(JSON, nullable=False)
+    body = Column(Text, nullable=False)
+
+    # not foreign keys, as entries should outlive the endpoints and responses they refer to.
+    endpoint_id = Column(Integer)
+    response_id = Column(Integer)
+
+    status_code = Column(Integer, nullable=False)
+    # in seconds.
+    duration = Column(Float, nullable=False)
+    timings = Column(JSON, nullable=False)
+
+    def __str__(self) -> str:
+        return f"{self.method} {self.path} ({self.status_code})"
@@ -0,0 +1,226 @@
+"""
+Keeps the configuration snapshot of every worker in every pod up to date when the configuration changes.
+
+A change is applied to the snapshot of the process that made it, and published on a postgres notification channel
+with the ids of the endpoints that changed. Every process listens on the channel in a background thread and reloads
+just those endpoints. Whenever the listener (re)connects it reloads everything, as notifications sent while it wasn't
+listening are lost.
+
+Every notification carries the next configuration version, kept in the database. Versions are sent in order, so a
+listener that sees a version more than one past the last it saw has missed a notification, and reloads everything.
+"""
+import json
+import os
+import select
+import socket
+import threading
+import time
+from typing import Collection, Iterable, Optional
+
+import psycopg2
+from flask import Flask
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import SQLAlchemyError
+
+from api_reflector import db
+from api_reflector.models import config_version
+from api_reflector.reporting import get_logger
+from api_reflector.snapshot import config_store
+from settings import settings
+
+log = get_logger(__name__)
+
+CHANNEL = "api_reflector_config"
+
+# postgres limits payloads to 8000 bytes. larger changes are sent as a change to everything instead.
+MAX_PAYLOAD_LENGTH = 7000
+
+# in seconds. how long the listener waits for a notification at a time; notifications are received as soon as they're
+# sent regardless.
+WAIT_TIMEOUT = 5
+
+
+def origin() -> str:
+    """
+    Identifies this process, so that it can ignore the notifications it sent itself.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def make_payload(endpoint_ids: Optional[Iterable[int]], version: int) -> str:
+    """
+    Encodes a notification of the given configuration version, which changed the given endpoints, or everything if no
+    endpoint ids are given.
+    """
+    payload = json.dumps(
+        {
+            "origin": origin(),
+            "version": version,
+            "endpoints": None if endpoint_ids is None else sorted(endpoint_ids),
+        }
+    )
+    if len(payload) > MAX_PAYLOAD_LENGTH:
+        return make_payload(None, version)
+    return payload
+
+
+def notify(connection: Connection, endpoint_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Bumps the configuration version, and notifies every listening process that the given endpoints changed, or that
+    everything changed if no endpoint ids are given. The notification is sent when the connection's transaction is
+    committed. Returns the new version.
+    """
+    # the bump locks the version row until the transaction ends, so notifications are sent in version order.
+    version = connection.execute(
+        insert(config_version)
+        .values(id=1, version=1)
+        .on_conflict_do_update(index_elements=["id"], set_={"version": config_version.c.version + 1})
+        .returning(config_version.c.version)
+    ).scalar_one()
+    connection.execute(
+        text("SELECT pg_notify(:channel, :payload)"), channel=CHANNEL, payload=make_payload(endpoint_ids, version)
+    )
+    return version
+
+
+def publish(endpoint_ids: Optional[Collection[int]] = None) -> None:
+    """
+    Notifies every other process that the given endpoints changed, or that everything changed if no endpoint ids are
+    given. Changes to no endpoints, such as tag edits, are still published to bump the configuration version.
+    Failing to notify is logged rather than raised, as the change itself has already been made.
+    Requires an application context.
+    """
+    if not settings.config_notifications_enabled:
+        return
+
+    try:
+        with db.sqla.engine.begin() as connection:
+            notify(connection, endpoint_ids)
+    except SQLAlchemyError as ex:
+        log.warning(f"Failed to notify other processes of a configuration change: {ex}")
+
+
+def config_changed(endpoint_ids: Optional[Collection[int]] = None) -> None:
+    """
+    Reloads the given endpoints, or everything if no endpoint ids are given, and notifies every other process to do
+    the same. Requires an application context.
+    """
+    if endpoint_ids is None:
+        config_store.invalidate()
+    elif endpoint_ids:
+        config_store.refresh(endpoint_ids)
+    publish(endpoint_ids)
+
+
+class ConfigListener:
+    """
+    Listens for configuration change notifications in a background thread, and applies them to the snapshot.
+    Once started, the thread is started again in each new process, as threads don't survive a fork. This keeps workers
+    forked after the app was created, such as with `gunicorn --preload`, listening.
+    """
+
+    def __init__(self, reconnect_interval: float) -> None:
+        self.reconnect_interval = reconnect_interval
+        self._app: Optional[Flask] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+
+    def start(self, app: Flask) -> None:
+        """
+        Starts listening in a background thread, using the given app to reach the database.
+        """
+        self._app = app
+        self.ensure_started()
+
+    def ensure_started(self) -> None:
+        """
+        Starts the listening thread in this process if the listener has been started in this or a parent process, and
+        the thread isn't already running here. Called on every request, so it's cheap when there's nothing to do.
+        """
+        if self._app is None or self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            threading.Thread(target=self._work, name="config-listener", daemon=True).start()
+            self._pid = os.getpid()
+
+    def apply(self, payloads: Iterable[str]) -> None:
+        """
+        Applies the changes described by the given notification payloads, or reloads everything if the versions show
+        that a notification was missed.
+        """
+        everything = False
+        endpoint_ids: set[int] = set()
+        for payload in payloads:
+            try:
+                change = json.loads(payload)
+            except ValueError:
+                log.warning(f"Ignoring invalid configuration change notification: {payload}")
+                continue
+
+            # our own notifications count towards the version too, so they can't look like a gap.
+            version = change.get("version")
+            if isinstance(version, int):
+                if self._version is not None and version > self._version + 1:
+                    log.warning(
+                        "Missed configuration versions %s to %s, reloading everything.", self._version + 1, version - 1
+                    )
+                    everything = True
+                self._version = version if self._version is None else max(self._version, version)
+
+            if change.get("origin") == origin():
+                continue
+            if change.get("endpoints") is None:
+                everything = True
+            else:
+                endpoint_ids.update(change["endpoints"])
+
+        if everything:
+            log.debug("Configuration changed, reloading everything.")
+            config_store.invalidate()
+        elif endpoint_ids:
+            log.debug("Configuration changed, reloading endpoints %s.", endpoint_ids)
+            assert self._app is not None, "listener has not been started"
+            with self._app.app_context():
+                config_store.refresh(endpoint_ids)
+
+    def _work(self) -> None:
+        while True:
+            try:
+                self._listen()
+            except Exception as ex:  # pylint: disable=broad-except
+                log.warning(f"Stopped receiving configuration change notifications, reconnecting: {ex}")
+            time.sleep(self.reconnect_interval)
+
+    def _listen(self) -> None:
+        connection = psycopg2.connect(settings.database_url)
+        try:
+            connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+
+            # anything could have changed while we weren't listening. this isn't known to follow a change, so the
+            # reload can use the read replica. the version is picked up again from the next notification.
+            self._version = None
+            config_store.invalidate(from_primary=False)
+
+            while True:
+                if select.select([connection], [], [], WAIT_TIMEOUT) == ([], [], []):
+                    continue
+
+                connection.poll()
+                payloads = [notification.payload for notification in connection.notifies]
+                connection.notifies.clear()
+                self.apply(payloads)
+        finally:
+            connection.close()
+
+
+config_listener = ConfigListener(reconnect_interval=settings.config_notifications_reconnect_interval)
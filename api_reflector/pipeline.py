@@ -0,0 +1,141 @@
+"""
+Implements the steps of serving a mock response, independently of the web framework serving it.
+Shared by the flask mock view and the ASGI app.
+"""
+import itertools
+from typing import Any, Iterator, Optional, Union
+
+from jinja2.exceptions import TemplateError, TemplateSyntaxError, UndefinedError
+from werkzeug.datastructures import ImmutableMultiDict
+
+from api_reflector import metrics, rules_engine
+from api_reflector.reporting import get_logger
+from api_reflector.snapshot import EndpointSnapshot, ResponseSnapshot
+from api_reflector.templating import compile_template, default_context
+
+log = get_logger(__name__)
+
+NO_ACTIVE_RESPONSES = "No Mock Responses configured or active for this endpoint"
+
+# the errors that can be raised while scoring and rendering a response.
+TEMPLATE_ERRORS = (UndefinedError, TemplateSyntaxError, TemplateError)
+
+# used in place of the query string when no response reads it.
+EMPTY_QUERY: ImmutableMultiDict = ImmutableMultiDict()
+
+# a mock response body: static content, rendered content, or chunks of streamed content.
+Body = Union[bytes, str, Iterator[str]]
+
+# streamed content is sent in chunks of at least this many characters, rather than one chunk per template node.
+STREAM_CHUNK_SIZE = 16_384
+
+
+def choose_response(
+    endpoint: EndpointSnapshot, request: rules_engine.TemplatableRequest, timings: Optional[dict[str, float]] = None
+) -> Optional[ResponseSnapshot]:
+    """
+    Returns the best active response of the given endpoint for the request, or None if the endpoint has no active
+    responses.
+    If a timings dict is given, the time taken is recorded in it.
+    """
+    if endpoint.response_index is not None:
+        with metrics.timed("find_best_response", timings):
+            return endpoint.response_index.find_best(request)
+
+    response_rules = [(response, response.rules) for response in endpoint.responses if response.is_active]
+    if not response_rules:
+        return None
+
+    with metrics.timed("find_best_response", timings):
+        return rules_engine.find_best_response(request, response_rules)
+
+
+def render_content(
+    response: ResponseSnapshot, request: rules_engine.TemplatableRequest, timings: Optional[dict[str, float]] = None
+) -> str:
+    """
+    Renders the content of the given response for the request.
+    If a timings dict is given, the time taken is recorded in it.
+    """
+    with metrics.timed("render", timings):
+        return compile_template(response.content).render(_template_context(request))
+
+
+def render_body(
+    response: ResponseSnapshot, request: rules_engine.TemplatableRequest, timings: Optional[dict[str, float]] = None
+) -> tuple[Body, str]:
+    """
+    Returns the body to send for the given response, and the content to pass to its actions.
+    Static responses are sent as-is, streamed responses are rendered as they're sent, and everything else is rendered
+    in full.
+    """
+    if response.static_body is not None:
+        # only decoded when an action needs it, so that static responses cost no work at all.
+        return response.static_body, response.static_body.decode() if response.actions else ""
+
+    if response.stream:
+        # streamed content isn't available to actions, as it hasn't been rendered yet.
+        return stream_content(response, request, timings), ""
+
+    content = render_content(response, request, timings)
+    return content, content
+
+
+def stream_content(
+    response: ResponseSnapshot, request: rules_engine.TemplatableRequest, timings: Optional[dict[str, float]] = None
+) -> Iterator[str]:
+    """
+    Renders the content of the given response for the request as it is consumed, in chunks.
+    The first chunk is rendered straight away, so that errors at the start of the template are raised here rather than
+    after the response has started. If a timings dict is given, the time taken to render the first chunk is recorded in
+    it.
+    """
+    with metrics.timed("render", timings):
+        chunks = _join_chunks(compile_template(response.content).generate(_template_context(request)))
+        first = next(chunks, "")
+
+    return itertools.chain([first], _log_errors(response, chunks))
+
+
+def _template_context(request: rules_engine.TemplatableRequest) -> dict[str, Any]:
+    return {
+        "request": request,
+        **default_context,
+    }
+
+
+def _join_chunks(chunks: Iterator[str]) -> Iterator[str]:
+    buffer: list[str] = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= STREAM_CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer, length = [], 0
+
+    if buffer:
+        yield "".join(buffer)
+
+
+def _log_errors(response: ResponseSnapshot, chunks: Iterator[str]) -> Iterator[str]:
+    try:
+        yield from chunks
+    except TEMPLATE_ERRORS as ex:
+        # the status has already been sent, so all we can do is cut the response short.
+        log.error(f"Streamed response {response.id} failed part way through. {template_error_message(ex)}")
+        raise
+
+
+def template_error_message(ex: Union[UndefinedError, TemplateSyntaxError, TemplateError]) -> str:
+    """
+    Returns the error message returned to clients when a response can't be rendered.
+    """
+    if isinstance(ex, UndefinedError):
+        msg = "Undefined field used in the response template"
+    elif isinstance(ex, TemplateSyntaxError):
+        msg = "Syntax error in response template"
+    else:
+        msg = "Failed to render fields in the response template"
+
+    return f"{msg}. Details: {ex}"
@@ -1,10 +1,22 @@
 """
 Sets up logging for the project and exposes a `get_logger` function.
+
+Log records are handed to a bounded queue and written by a background thread, so logging never blocks a worker on
+stdout. If the queue fills up, new records are dropped and counted. Loggers can also be configured to keep only a
+sample of their debug and info records, which is useful for loggers that log on every mock request.
 """
 
+import atexit
 import json
 import logging
+import os
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
 
+from api_reflector import metrics
 from settings import settings
 
 LOG_FORMAT = "%(asctime)s | %(levelname)8s | %(name)s\n%(message)s"  # only used if JSON logging is disabled.
@@ -28,22 +40,106 @@ class JSONFormatter(logging.Formatter):
                 "module": record.module,
                 "function": record.funcName,
                 "name": record.name,
-                "message": record.msg,
+                "message": record.getMessage(),
             }
         )
 
 
-def get_logger(name: str) -> logging.Logger:
+class SamplingFilter(logging.Filter):  # pylint: disable=too-few-public-methods
     """
-    Returns a correctly configured logger with the given name.
+    Keeps the given fraction of debug and info records, chosen at random. Warnings and errors are always kept.
     """
-    logger = logging.getLogger(name.lower().replace(" ", "-"))
 
-    # if this logger is already configured, return it now
-    if logger.handlers:
-        return logger
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
 
-    logger.propagate = False
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # waits for room in a full queue, so that stopping never loses the records still waiting to be written.
+        self.queue.put(self._sentinel)  # type: ignore
+
+
+class BackgroundHandler(QueueHandler):
+    """
+    Hands log records to a background thread that formats them and writes them with the given handler.
+    The thread is started on first use in each process, so the handler is safe to create before gunicorn forks.
+    """
+
+    def __init__(self, handler: logging.Handler, capacity: int) -> None:
+        super().__init__(queue.Queue(capacity))
+        self.handler = handler
+        self.capacity = capacity
+        self.dropped = 0
+        self._pid: Optional[int] = None
+        self._listener: Optional[QueueListener] = None
+        self._start_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the message is merged with its arguments now, as they may have changed by the time the record is written.
+        # everything else is left for the writer thread.
+        message = record.getMessage()
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.log_dropped.inc()
+
+    def stop(self) -> None:
+        """
+        Writes any queued records and stops the writer thread.
+        """
+        with self._start_lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+    def _ensure_started(self) -> None:
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+
+        with self._start_lock:
+            if self._pid != pid:
+                self._start(pid)
+
+    def _start(self, pid: int) -> None:
+        # a forked process inherits its parent's queue, but not the thread that consumes it.
+        self.queue = queue.Queue(self.capacity)
+        self._listener = _Listener(self.queue, self.handler, respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self.stop)
+        self._pid = pid
+
+
+_handler: Optional[logging.Handler] = None
+
+
+def _get_handler() -> logging.Handler:
+    """
+    Returns the handler shared by every logger, creating it on first use.
+    """
+    global _handler  # pylint: disable=global-statement
+    if _handler is not None:
+        return _handler
 
     formatter: logging.Formatter
     if settings.log_json:
@@ -51,11 +147,34 @@ def get_logger(name: str) -> logging.Logger:
     else:
         formatter = logging.Formatter(LOG_FORMAT)
 
-    handler = logging.StreamHandler()
+    handler: logging.Handler = logging.StreamHandler()
     handler.setLevel(settings.log_level)
     handler.setFormatter(formatter)
 
-    logger.addHandler(handler)
+    if settings.log_async:
+        handler = BackgroundHandler(handler, settings.log_queue_size)
+        handler.setLevel(settings.log_level)
+
+    _handler = handler
+    return handler
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Returns a correctly configured logger with the given name.
+    """
+    logger = logging.getLogger(name.lower().replace(" ", "-"))
+
+    # if this logger is already configured, return it now
+    if logger.handlers:
+        return logger
+
+    logger.propagate = False
+
+    logger.addHandler(_get_handler())
     logger.setLevel(settings.log_level)
 
+    if (rate := settings.log_sample_rates.get(logger.name)) is not None:
+        logger.addFilter(SamplingFilter(rate))
+
     return logger
@@ -0,0 +1,33 @@
+"""
+Compiles the werkzeug routing tables used to match mock paths to endpoints.
+"""
+from typing import Any, Iterable, Mapping
+
+from werkzeug.routing import Map, MapAdapter, Rule
+
+
+class RouteTable:  # pylint: disable=too-few-public-methods
+    """
+    A set of compiled werkzeug routing tables, one per HTTP method.
+    Routes are given as (method, path, key) triples, where the key is returned when a path matches.
+    """
+
+    def __init__(self, routes: Iterable[tuple[str, str, Any]]) -> None:
+        rules: dict[str, list[Rule]] = {}
+        for method, path, key in routes:
+            rules.setdefault(method.upper(), []).append(Rule(path, endpoint=key, methods=[method.upper()]))
+
+        self._adapters: dict[str, MapAdapter] = {
+            method: Map(method_rules).bind("localhost") for method, method_rules in rules.items()
+        }
+        self._empty = Map().bind("localhost")
+
+    def match(self, method: str, path: str) -> tuple[Any, Mapping[str, Any]]:
+        """
+        Matches the given method and path against the routing table for that method.
+        Returns the key of the matched route as well as a mapping of URL parameters passed to it.
+        If no route was matched, raises a NotFound exception.
+        """
+        method = method.upper()
+        adapter = self._adapters.get(method, self._empty)
+        return adapter.match(path, method=method)
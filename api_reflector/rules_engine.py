@@ -2,13 +2,31 @@
 Defines the rules engine.
 """
 
+import heapq
 import operator
 import random
+from collections import Counter
 from enum import Enum
-from typing import Any, Callable, Mapping, NamedTuple, TypeVar, Union
+from typing import (
+    Any,
+    Callable,
+    Generic,
+    Iterable,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+)
 
 from api_reflector.storage import GlobalStorage
-from api_reflector.templating import default_context, template_env
+from api_reflector.templating import (
+    compile_template,
+    default_context,
+    referenced_request_fields,
+    template_env,
+)
 
 
 class Operator(Enum):
@@ -62,6 +80,31 @@ evaluators: dict[Operator, EvaluatorFunction] = {
     Operator.NOT_CONTAINS: lambda x, y: y not in x,
 }
 
+numeric_operators = {
+    Operator.LESS_THAN,
+    Operator.LESS_THAN_EQUAL,
+    Operator.GREATER_THAN,
+    Operator.GREATER_THAN_EQUAL,
+}
+
+# a rough ranking of how likely rules using each operator are to reject a request. lower values are tried first.
+operator_selectivity = {
+    Operator.EQUAL: 0,
+    Operator.CONTAINS: 1,
+    Operator.LESS_THAN: 2,
+    Operator.LESS_THAN_EQUAL: 2,
+    Operator.GREATER_THAN: 2,
+    Operator.GREATER_THAN_EQUAL: 2,
+    Operator.IS_EMPTY: 3,
+    Operator.NOT_EQUAL: 4,
+    Operator.NOT_CONTAINS: 4,
+    Operator.IS_NOT_EMPTY: 4,
+}
+
+# renders a template source with the current request context.
+Renderer = Callable[[str], Any]
+Predicate = Callable[[Renderer], bool]
+
 
 class TemplatableRequest(NamedTuple):
     """
@@ -80,53 +123,284 @@ class ScoringRule(NamedTuple):
     """
 
     operator: Operator
-    arguments: list[str]
+    arguments: Sequence[str]
+
+
+class CompiledRule(NamedTuple):
+    """
+    A scoring rule compiled into a predicate.
+    Literal arguments are rendered, and for numeric operators coerced to floats, once at compile time.
+    `cost` is the number of arguments that must be rendered each time the predicate is evaluated.
+    `request_fields` are the fields of the request that the arguments read.
+    """
+
+    operator: Operator
+    arguments: Sequence[str]
+    cost: int
+    predicate: Predicate
+    request_fields: frozenset[str] = frozenset()
+
+
+def is_literal(source: str) -> bool:
+    """
+    Returns true if the given rule argument contains no template syntax, and so always renders to the same value.
+    """
+    return not any(
+        delimiter in source
+        for delimiter in (
+            template_env.variable_start_string,
+            template_env.block_start_string,
+            template_env.comment_start_string,
+        )
+    )
+
+
+def _compile_argument(source: str, numeric: bool) -> Callable[[Renderer], Any]:
+    if not is_literal(source):
+        return lambda render: render(source)
+
+    value: Any = compile_template(source).render()
+    if numeric:
+        try:
+            value = float(value)
+        except ValueError:
+            # leave the evaluator to fail on this argument at request time, as it would have without compilation.
+            pass
+    return lambda _render: value
+
+
+def _make_predicate(evaluator: Callable[..., bool], getters: list[Callable[[Renderer], Any]]) -> Predicate:
+    if len(getters) == 1:
+        (first,) = getters
+
+        def predicate1(render: Renderer) -> bool:
+            return evaluator(first(render))
+
+        return predicate1
+
+    if len(getters) == 2:
+        first, second = getters
+
+        def predicate2(render: Renderer) -> bool:
+            return evaluator(first(render), second(render))
+
+        return predicate2
+
+    def predicate(render: Renderer) -> bool:
+        return evaluator(*(get(render) for get in getters))
+
+    return predicate
+
+
+def compile_rule(rule: Union[ScoringRule, CompiledRule]) -> CompiledRule:
+    """
+    Compiles the given rule into a predicate. Rules that are already compiled are returned as-is.
+    """
+    if isinstance(rule, CompiledRule):
+        return rule
+
+    getters = [_compile_argument(arg, rule.operator in numeric_operators) for arg in rule.arguments]
+    cost = sum(not is_literal(arg) for arg in rule.arguments)
+    return CompiledRule(
+        operator=rule.operator,
+        arguments=tuple(rule.arguments),
+        cost=cost,
+        predicate=_make_predicate(evaluators[rule.operator], getters),
+        request_fields=frozenset().union(*(referenced_request_fields(arg) for arg in rule.arguments)),
+    )
+
+
+def compile_rules(rules: Iterable[Union[ScoringRule, CompiledRule]]) -> tuple[CompiledRule, ...]:
+    """
+    Compiles the given rules, ordered so that the cheapest and most selective rules are evaluated first.
+    """
+    return tuple(
+        sorted(
+            (compile_rule(rule) for rule in rules),
+            key=lambda rule: (rule.cost, operator_selectivity[rule.operator]),
+        )
+    )
+
+
+class RenderContext:  # pylint: disable=too-few-public-methods
+    """
+    The template context used to render rule arguments for a single request.
+    Rendered values are memoized by template source, so an expression used by rules on several responses is only
+    rendered once per request.
+    """
+
+    __slots__ = ("template_context", "_rendered")
+
+    def __init__(self, request: TemplatableRequest) -> None:
+        self.template_context: dict[str, Any] = {
+            "request": request,
+            "storage": GlobalStorage(),
+            **default_context,
+        }
+        self._rendered: dict[str, str] = {}
 
+    def render(self, source: str) -> str:
+        """
+        Renders the given template source, or returns the value it rendered to earlier in this request.
+        """
+        try:
+            return self._rendered[source]
+        except KeyError:
+            value = self._rendered[source] = compile_template(source).render(self.template_context)
+            return value
 
-def score_response(request: TemplatableRequest, rules: list[ScoringRule]) -> float:
+
+def score_response(
+    request: TemplatableRequest,
+    rules: Sequence[Union[ScoringRule, CompiledRule]],
+    context: Optional[RenderContext] = None,
+) -> float:
     """
     Applies the given response rules to a request and returns the score.
-    Scores are between -1 and 1.
+    Scores are -1 if any rule fails, otherwise the number of rules.
+    Rules are evaluated in the order given, so compile them with `compile_rules` first to have the cheapest and most
+    selective rules evaluated first.
+    A render context can be given to share rendered arguments with other responses scored for the same request.
     """
 
     # if there are no rules, this request gets a score of 0
     if not rules:
         return 0
 
-    template_context: dict[str, Any] = {
-        "request": request,
-        "storage": GlobalStorage(),
-        **default_context,
-    }
+    if context is None:
+        context = RenderContext(request)
 
     for rule in rules:
-        args = [template_env.from_string(arg).render(**template_context) for arg in rule.arguments]
-        evaluator = evaluators[rule.operator]
-        if not evaluator(*args):
+        if not compile_rule(rule).predicate(context.render):
             return -1
     return len(rules)
 
 
 ResponseT = TypeVar("ResponseT")
+Candidate = tuple[ResponseT, Sequence[Union[ScoringRule, CompiledRule]]]
+
+
+def _pick_best(
+    scoreable_request: TemplatableRequest, candidates: Iterable[Candidate[ResponseT]], context: RenderContext
+) -> ResponseT:
+    best_score: float = -1
+    best_responses: list[ResponseT] = []
+    for response, rules in candidates:
+        if len(rules) < best_score:
+            break
+
+        score = score_response(scoreable_request, rules, context)
+        if score < 0:
+            continue
+
+        if score > best_score:
+            best_score = score
+            best_responses = [response]
+        elif score == best_score:
+            best_responses.append(response)
+
+    # pick a response from the best options
+    return random.choice(best_responses)
+
+
+def _by_rule_count(response_rules: Iterable[Candidate[ResponseT]]) -> list[Candidate[ResponseT]]:
+    # a response can score at most its number of rules, so scoring the responses with the most rules first lets us
+    # stop as soon as no remaining response can reach the best score so far.
+    return sorted(response_rules, key=lambda candidate: len(candidate[1]), reverse=True)
 
 
 def find_best_response(
-    scoreable_request: TemplatableRequest, response_rules: list[tuple[ResponseT, list[ScoringRule]]]
+    scoreable_request: TemplatableRequest,
+    response_rules: Sequence[Candidate[ResponseT]],
 ) -> ResponseT:
     """
     Using the given collection of responses & rules, returns the highest scoring response for the given request.
+    If several responses share the highest score, one of them is picked at random.
     """
-    # score each response
-    scores = [
-        (
-            score_response(scoreable_request, rules),
-            response,
-        )
-        for response, rules in response_rules
-    ]
-    scores = [(score, response) for score, response in scores if score >= 0]
-    # sort by score
-    scores = sorted(scores, key=lambda score: score[0], reverse=True)
-
-    # pick a score from the best options
-    return random.choice([score[1] for score in scores if score[0] == scores[0][0]])
+    context = RenderContext(scoreable_request)
+    candidates = _by_rule_count((response, compile_rules(rules)) for response, rules in response_rules)
+    return _pick_best(scoreable_request, candidates, context)
+
+
+def equality_key(rule: CompiledRule) -> Optional[tuple[str, str]]:
+    """
+    If the given rule compares a template expression to a literal with EQUAL, returns the expression and the value of
+    the literal. Otherwise returns None.
+    """
+    if rule.operator is not Operator.EQUAL or len(rule.arguments) != 2:
+        return None
+
+    first, second = rule.arguments
+    if is_literal(first) == is_literal(second):
+        return None
+
+    expression, literal = (second, first) if is_literal(first) else (first, second)
+    return expression, compile_template(literal).render()
+
+
+def _equality_keys(rules: Iterable[CompiledRule]) -> dict[str, str]:
+    # maps each expression compared to a literal by the given rules to the first literal it's compared to. a response
+    # can only be indexed under one value per expression; it still has to pass every rule once selected.
+    keys: dict[str, str] = {}
+    for rule in rules:
+        key = equality_key(rule)
+        if key is not None:
+            keys.setdefault(*key)
+    return keys
+
+
+class ResponseIndex(Generic[ResponseT]):
+    """
+    A set of responses prepared for finding the best response for each request.
+
+    If several responses have an EQUAL rule comparing the same expression to a literal, such as
+    `{{ request.params.id }} == 1234`, they are indexed by the literal's value. Each request then renders the
+    expression once, and only scores the responses indexed under the rendered value along with the responses that
+    aren't indexed. Every other response would have failed its EQUAL rule, so the result is the same as from
+    `find_best_response`.
+    """
+
+    __slots__ = ("candidates", "expression", "_indexed", "_unindexed")
+
+    def __init__(self, response_rules: Iterable[Candidate[ResponseT]]) -> None:
+        # ordered the same way as in find_best_response, so that ties are broken identically.
+        self.candidates = _by_rule_count((response, compile_rules(rules)) for response, rules in response_rules)
+
+        keys = [_equality_keys(compile_rules(rules)) for _, rules in self.candidates]
+        counts = Counter(expression for response_keys in keys for expression in response_keys)
+        self.expression: Optional[str] = None
+        if counts:
+            expression, count = counts.most_common(1)[0]
+            if count > 1:
+                self.expression = expression
+
+        self._indexed: dict[str, list[int]] = {}
+        self._unindexed: list[int] = []
+        for position, response_keys in enumerate(keys):
+            if self.expression in response_keys:
+                self._indexed.setdefault(response_keys[self.expression], []).append(position)
+            else:
+                self._unindexed.append(position)
+
+    def select(self, context: RenderContext) -> list[Candidate[ResponseT]]:
+        """
+        Returns the responses that could match the request of the given context, in scoring order.
+        """
+        if self.expression is None:
+            return self.candidates
+
+        try:
+            value = context.render(self.expression)
+        except Exception:  # pylint: disable=broad-except
+            # score everything, so that the error is raised (or not) exactly as it would be without the index.
+            return self.candidates
+
+        positions = heapq.merge(self._indexed.get(value, ()), self._unindexed)
+        return [self.candidates[position] for position in positions]
+
+    def find_best(self, scoreable_request: TemplatableRequest) -> ResponseT:
+        """
+        Returns the highest scoring response for the given request, as `find_best_response` would.
+        """
+        context = RenderContext(scoreable_request)
+        return _pick_best(scoreable_request, self.select(context), context)
@@ -0,0 +1,66 @@
+"""
+Switches between test scenarios, where a scenario is the set of responses tagged with the same tag.
+
+Activating a scenario makes the tagged responses the only active responses of their endpoints, in a single bulk
+update. Endpoints without any tagged responses are left as they are, so scenarios that cover different endpoints can be
+combined by activating each of them in turn.
+"""
+from typing import NamedTuple
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import Connection
+
+from api_reflector import models
+
+response_table = models.Response.__table__
+tag_table = models.Tag.__table__
+response_tag_table = models.response_tag
+
+
+class ActivationSummary(NamedTuple):
+    """
+    The responses whose state changed when a scenario was activated.
+    """
+
+    activated: list[int]
+    deactivated: list[int]
+    # the endpoints of the changed responses.
+    endpoints: list[int]
+
+    @property
+    def changes(self) -> dict[int, bool]:
+        """
+        Maps the id of each changed response to whether it's now active.
+        """
+        return {**dict.fromkeys(self.activated, True), **dict.fromkeys(self.deactivated, False)}
+
+
+def activate_scenario(connection: Connection, name: str) -> ActivationSummary:
+    """
+    Activates the responses tagged with the given tag, and deactivates every other response of the same endpoints.
+    Raises a LookupError if there is no such tag.
+    """
+    with connection.begin():
+        tag_id = connection.execute(select(tag_table.c.id).where(tag_table.c.name == name)).scalar()
+        if tag_id is None:
+            raise LookupError(f"No tag named `{name}`")
+
+        tagged = select(response_tag_table.c.response_id).where(response_tag_table.c.tag_id == tag_id)
+        # aliased, so that the subquery isn't correlated with the table being updated.
+        scenario_response = response_table.alias()
+        endpoints = select(scenario_response.c.endpoint_id).where(scenario_response.c.id.in_(tagged))
+
+        is_tagged = response_table.c.id.in_(tagged)
+        rows = connection.execute(
+            update(response_table)
+            .where(response_table.c.endpoint_id.in_(endpoints))
+            .where(response_table.c.is_active.is_distinct_from(is_tagged))
+            .values(is_active=is_tagged)
+            .returning(response_table.c.id, response_table.c.is_active, response_table.c.endpoint_id)
+        ).all()
+
+    return ActivationSummary(
+        activated=sorted(response_id for response_id, is_active, _ in rows if is_active),
+        deactivated=sorted(response_id for response_id, is_active, _ in rows if not is_active),
+        endpoints=sorted({endpoint_id for _, _, endpoint_id in rows}),
+    )
@@ -0,0 +1,353 @@
+"""
+Provides a detached, read-only snapshot of the mock configuration for the mock serving path.
+
+The whole Endpoint -> Response -> Rule/Action graph is loaded in a handful of queries and copied into plain immutable
+objects. Requests are served from the current snapshot without touching the database. When the configuration changes,
+the store is invalidated and the next request atomically swaps in a freshly loaded generation.
+"""
+import hashlib
+import threading
+from typing import Any, Collection, Iterable, Mapping, NamedTuple, Optional
+
+from sqlalchemy.orm import Session, selectinload
+
+from api_reflector import actions, db, models
+from api_reflector.reporting import get_logger
+from api_reflector.routing import RouteTable
+from api_reflector.rules_engine import (
+    CompiledRule,
+    ResponseIndex,
+    ScoringRule,
+    compile_rules,
+    is_literal,
+)
+from api_reflector.templating import (
+    REQUEST_FIELDS,
+    referenced_request_fields,
+    template_env,
+)
+
+log = get_logger(__name__)
+
+
+class ActionSnapshot(NamedTuple):
+    """
+    A read-only copy of an action.
+    """
+
+    action: actions.Action
+    arguments: tuple[str, ...]
+
+    def __str__(self) -> str:
+        return f"{self.action}: {', '.join(self.arguments)}"
+
+    def execute(self, req_json: Mapping[str, Any], content: str):
+        """
+        Executes this action.
+        """
+        log.debug("Executing action: %s", self)
+        actions.action_executors[self.action](*self.arguments, request=req_json, response=content)
+
+
+class ResponseSnapshot(NamedTuple):
+    """
+    A read-only copy of a response, its compiled rules and its actions.
+    """
+
+    id: int
+    name: str
+    status_code: int
+    content_type: str
+    content: str
+    is_active: bool
+    rules: tuple[CompiledRule, ...]
+    actions: tuple[ActionSnapshot, ...]
+    stream: bool = False
+    # the encoded content of responses without any template syntax, which is served as-is instead of being rendered.
+    static_body: Optional[bytes] = None
+    # the entity tag of the static body, if there is one.
+    static_etag: Optional[str] = None
+    # the fields of the request read by this response's rules, content and actions.
+    request_fields: frozenset[str] = REQUEST_FIELDS
+
+    def __str__(self) -> str:
+        body = self.content if len(self.content) <= 20 else f"{self.content[:20]}..."
+        return f"{self.status_code} {body}" if body else str(self.status_code)
+
+    def execute_actions(self, req_json: Mapping[str, Any], content: str):
+        """
+        Executes all actions for this response, in order.
+        """
+        log.debug("Executing actions for response: %s", self)
+
+        for action in self.actions:
+            action.execute(req_json, content)
+
+
+class EndpointSnapshot(NamedTuple):
+    """
+    A read-only copy of an endpoint and its responses.
+    """
+
+    id: int
+    name: str
+    method: str
+    path: str
+    responses: tuple[ResponseSnapshot, ...]
+    # the fields of the request read by any of this endpoint's responses. only these fields need to be parsed.
+    request_fields: frozenset[str] = REQUEST_FIELDS
+    # the active responses, indexed for choosing between them. None if there are no active responses, or if the
+    # snapshot was built by hand, in which case responses are scored without an index.
+    response_index: Optional[ResponseIndex[ResponseSnapshot]] = None
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.method} {self.path})"
+
+
+class ConfigSnapshot:  # pylint: disable=too-few-public-methods
+    """
+    A single generation of the mock configuration, with its compiled routing table.
+    """
+
+    __slots__ = ("generation", "endpoints", "routes")
+
+    def __init__(
+        self, generation: int, endpoints: Mapping[int, EndpointSnapshot], routes: Optional[RouteTable] = None
+    ) -> None:
+        self.generation = generation
+        self.endpoints = endpoints
+        if routes is None:
+            routes = RouteTable((endpoint.method, endpoint.path, endpoint.id) for endpoint in endpoints.values())
+        self.routes = routes
+
+    def match(self, method: str, path: str) -> tuple[EndpointSnapshot, Mapping[str, Any]]:
+        """
+        Matches the given method and path to an endpoint.
+        Returns the matched endpoint as well as a mapping of URL parameters passed to the endpoint.
+        If no endpoint was matched, raises a NotFound exception.
+        """
+        endpoint_id, params = self.routes.match(method, path)
+        return self.endpoints[endpoint_id], params
+
+
+def make_etag(data: bytes) -> str:
+    """
+    Returns a strong entity tag for the given response body.
+    """
+    return hashlib.sha1(data).hexdigest()
+
+
+def encode_static(content: str) -> Optional[bytes]:
+    """
+    Returns the encoded body of the given response content if it contains no template syntax, or None otherwise.
+    """
+    if not is_literal(content):
+        return None
+
+    # rendered once rather than used directly, as jinja may alter static content, for example trailing newlines.
+    return template_env.from_string(content).render().encode()
+
+
+def snapshot_response(response: models.Response) -> ResponseSnapshot:
+    """
+    Copies a response model and its rules & actions into a response snapshot.
+    """
+    static_body = encode_static(response.content)
+    rules = compile_rules(
+        ScoringRule(operator=rule.operator, arguments=tuple(rule.arguments))
+        for rule in sorted(response.rules, key=lambda rule: rule.id)
+    )
+    response_actions = tuple(
+        ActionSnapshot(action=action.action, arguments=tuple(action.arguments))
+        for action in sorted(response.actions, key=lambda action: action.id)
+    )
+
+    request_fields = referenced_request_fields(response.content).union(*(rule.request_fields for rule in rules))
+    if any(action.action is actions.Action.CALLBACK for action in response_actions):
+        # callbacks send the request body along with them.
+        request_fields |= {"json"}
+
+    return ResponseSnapshot(
+        id=response.id,
+        name=response.name,
+        status_code=response.status_code,
+        content_type=response.content_type,
+        content=response.content,
+        is_active=response.is_active,
+        rules=rules,
+        actions=response_actions,
+        stream=response.stream,
+        static_body=static_body,
+        static_etag=None if static_body is None else make_etag(static_body),
+        request_fields=request_fields,
+    )
+
+
+def index_responses(responses: Iterable[ResponseSnapshot]) -> Optional[ResponseIndex[ResponseSnapshot]]:
+    """
+    Indexes the active responses among the given responses, or returns None if none of them are active.
+    """
+    active = [(response, response.rules) for response in responses if response.is_active]
+    if not active:
+        return None
+    return ResponseIndex(active)
+
+
+def snapshot_endpoint(endpoint: models.Endpoint) -> EndpointSnapshot:
+    """
+    Copies an endpoint model and its responses into an endpoint snapshot.
+    """
+    responses = tuple(
+        snapshot_response(response) for response in sorted(endpoint.responses, key=lambda response: response.id)
+    )
+    return EndpointSnapshot(
+        id=endpoint.id,
+        name=endpoint.name,
+        method=str(endpoint.method),
+        path=endpoint.path,
+        responses=responses,
+        request_fields=frozenset().union(*(response.request_fields for response in responses)),
+        response_index=index_responses(responses),
+    )
+
+
+def with_active(endpoint: EndpointSnapshot, changes: Mapping[int, bool]) -> EndpointSnapshot:
+    """
+    Returns a copy of the given endpoint snapshot with the active state of its responses changed as given by the
+    mapping of response ids to active states.
+    """
+    responses = tuple(
+        response._replace(is_active=changes[response.id]) if response.id in changes else response
+        for response in endpoint.responses
+    )
+    return endpoint._replace(responses=responses, response_index=index_responses(responses))
+
+
+def load_endpoints(
+    endpoint_ids: Optional[Collection[int]] = None, from_primary: bool = False
+) -> dict[int, EndpointSnapshot]:
+    """
+    Loads endpoints with their responses, rules and actions from the database, or from its read replica if one is
+    configured and `from_primary` is false. If endpoint ids are given only those endpoints are loaded, otherwise every
+    endpoint is.
+    """
+    with Session(bind=db.sqla.engine if from_primary else db.read_engine()) as session:
+        query = session.query(models.Endpoint).options(
+            selectinload(models.Endpoint.responses).selectinload(models.Response.rules),
+            selectinload(models.Endpoint.responses).selectinload(models.Response.actions),
+        )
+        if endpoint_ids is not None:
+            query = query.filter(models.Endpoint.id.in_(endpoint_ids))
+        return {endpoint.id: snapshot_endpoint(endpoint) for endpoint in query.all()}
+
+
+class ConfigStore:
+    """
+    Holds the current configuration snapshot.
+    Snapshots are loaded on first use and reloaded on the next use after `invalidate` is called.
+
+    Reloads that follow a change read from the primary database, as a read replica may not have the change yet and the
+    snapshot is kept until the next change. Only the first load and full reloads that don't follow a known change use
+    the replica.
+    """
+
+    def __init__(self) -> None:
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._generation = 0
+        self._from_primary = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        """
+        True if the next call to `current` will need to load a new snapshot.
+        """
+        return self._snapshot is None or self._snapshot.generation != self._generation
+
+    def invalidate(self, from_primary: bool = True) -> None:
+        """
+        Marks the current snapshot as stale. Unless `from_primary` is false, the next load reads from the primary
+        database, so that it sees the change that made the snapshot stale.
+        """
+        with self._lock:
+            self._generation += 1
+            self._from_primary = self._from_primary or from_primary
+
+    def publish(self, endpoints: Mapping[int, EndpointSnapshot]) -> ConfigSnapshot:
+        """
+        Replaces the current snapshot with one built from the given endpoints, instead of loading from the database.
+        """
+        with self._lock:
+            snapshot = ConfigSnapshot(self._generation, endpoints)
+            self._snapshot = snapshot
+        return snapshot
+
+    def apply_active(self, changes: Mapping[int, bool]) -> None:
+        """
+        Changes the active state of responses in the current snapshot, given a mapping of response ids to active
+        states. Only the affected endpoints are rebuilt, so the change is published at once without a reload.
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.generation != self._generation:
+                # the next load reads the changes from the database anyway.
+                return
+
+            endpoints = dict(snapshot.endpoints)
+            for endpoint in snapshot.endpoints.values():
+                if any(response.id in changes for response in endpoint.responses):
+                    endpoints[endpoint.id] = with_active(endpoint, changes)
+            self._snapshot = ConfigSnapshot(snapshot.generation, endpoints, snapshot.routes)
+
+    def refresh(self, endpoint_ids: Collection[int]) -> None:
+        """
+        Reloads the given endpoints into the current snapshot, leaving every other endpoint as it is. Endpoints that
+        no longer exist are removed. The routing table is only rebuilt if a route changed.
+        The endpoints are read from the primary database. Requires an application context.
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.generation != self._generation:
+                # the next load reads every change from the database anyway.
+                return
+
+            loaded = load_endpoints(endpoint_ids, from_primary=True)
+            endpoints = {
+                endpoint_id: endpoint
+                for endpoint_id, endpoint in snapshot.endpoints.items()
+                if endpoint_id not in endpoint_ids
+            }
+            endpoints.update(loaded)
+
+            routes: Optional[RouteTable] = snapshot.routes
+            before = {(endpoint.id, endpoint.method, endpoint.path) for endpoint in snapshot.endpoints.values()}
+            after = {(endpoint.id, endpoint.method, endpoint.path) for endpoint in endpoints.values()}
+            if before != after:
+                routes = None
+            self._snapshot = ConfigSnapshot(snapshot.generation, endpoints, routes)
+
+    def current(self) -> ConfigSnapshot:
+        """
+        Returns the current configuration snapshot, loading a new one if the current snapshot is stale.
+        Requires an application context if a load is needed.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.generation == self._generation:
+            return snapshot
+
+        with self._lock:
+            # another thread may have loaded the snapshot while we waited for the lock.
+            snapshot = self._snapshot
+            generation = self._generation
+            if snapshot is not None and snapshot.generation == generation:
+                return snapshot
+
+            log.debug("Loading configuration snapshot generation %s.", generation)
+            snapshot = ConfigSnapshot(generation, load_endpoints(from_primary=self._from_primary))
+            self._snapshot = snapshot
+            self._from_primary = False
+
+        return snapshot
+
+
+config_store = ConfigStore()
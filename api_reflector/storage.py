@@ -1,31 +1,268 @@
 """
 This module contains everything to do with short-term persistent storage for
 actions & rules in API reflector.
+
+Values are kept in a pluggable backend, chosen with the `storage_backend` setting:
+
+* `memory` keeps values in a dict local to this process.
+* `postgres` keeps values in an unlogged table, so they are shared by every worker and pod.
+
+If `storage_cache_ttl` is set, reads are additionally cached in-process for that many seconds. Values written by other
+processes may take up to that long to be seen.
 """
+import heapq
+import os
+import threading
 import time
-from typing import Optional
+import weakref
+from abc import ABC, abstractmethod
+from typing import Iterator, NamedTuple, Optional
 
-_global_storage: dict[str, tuple[str, float]] = {}
+from cachetools import TTLCache
+from sqlalchemy import text
 
+from api_reflector import db, metrics
+from settings import settings
 
-class GlobalStorage:
+
+class StorageBackend(ABC):
     """
-    A simple in-memory key-value store with expiry times.
-    Data is local to this process only.
+    A key-value store with expiry times.
     """
 
+    @abstractmethod
     def get(self, name: str) -> Optional[str]:
         """Attempt to retrieve a value from the store."""
-        value, expiry = _global_storage.get(name, (None, None))
-        if expiry is not None and expiry < time.time():
-            del _global_storage[name]
-            return None
+
+    @abstractmethod
+    def set(self, name: str, value: str, expiry: float) -> None:
+        """Set a value in the store with an expiry timestamp."""
+
+
+class StorageStats(NamedTuple):
+    """
+    Counters describing the contents of a memory backend.
+    """
+
+    live_keys: int
+    expirations: int
+    evictions: int
+
+
+class MemoryBackend(StorageBackend):  # pylint: disable=too-many-instance-attributes
+    """
+    Keeps values in a dict. Data is local to this process only.
+
+    Expired values are removed by a background thread that sweeps every `sweep_interval` seconds, using a heap ordered
+    by expiry time, so values that are never read again don't pile up. The thread is started on first use in each
+    process, so the backend is safe to create before gunicorn forks.
+    If more than `max_keys` values are stored, the values closest to expiring are evicted.
+    """
+
+    def __init__(self, max_keys: Optional[int] = None, sweep_interval: float = 1) -> None:
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self.expirations = 0
+        self.evictions = 0
+
+        self._values: dict[str, tuple[str, float]] = {}
+        # (expiry, name) pairs. entries are left behind when a value is overwritten, and skipped when popped.
+        self._expiry_heap: list[tuple[float, str]] = []
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+
+    def get(self, name: str) -> Optional[str]:
+        with self._lock:
+            self._ensure_started()
+            value, expiry = self._values.get(name, (None, None))
+            if expiry is not None and expiry < time.time():
+                del self._values[name]
+                self.expirations += 1
+                return None
 
         return value
 
+    def set(self, name: str, value: str, expiry: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._ensure_started()
+            self._values[name] = (value, expiry)
+            heapq.heappush(self._expiry_heap, (expiry, name))
+
+            if self.max_keys is not None and len(self._values) > self.max_keys:
+                self._sweep(now)
+                while len(self._values) > self.max_keys:
+                    if self._pop_soonest():
+                        self.evictions += 1
+
+    def sweep(self) -> None:
+        """
+        Removes all expired values.
+        """
+        with self._lock:
+            self._sweep(time.time())
+
+    def stats(self) -> StorageStats:
+        """
+        Returns the backend's current counters.
+        """
+        with self._lock:
+            return StorageStats(live_keys=len(self._values), expirations=self.expirations, evictions=self.evictions)
+
+    def _ensure_started(self) -> None:
+        # called with the lock held. threads don't survive a fork, so each process starts its own sweeper.
+        if self._pid != os.getpid():
+            threading.Thread(
+                target=_sweep_periodically,
+                args=(weakref.ref(self), self.sweep_interval),
+                name="storage-sweep",
+                daemon=True,
+            ).start()
+            self._pid = os.getpid()
+
+    def _sweep(self, now: float) -> None:
+        while self._expiry_heap and self._expiry_heap[0][0] < now:
+            if self._pop_soonest():
+                self.expirations += 1
+
+        # overwritten values leave stale heap entries behind, so rebuild the heap if they start to dominate.
+        if len(self._expiry_heap) > 2 * len(self._values) + 1024:
+            self._expiry_heap = [(expiry, name) for name, (_, expiry) in self._values.items()]
+            heapq.heapify(self._expiry_heap)
+
+    def _pop_soonest(self) -> bool:
+        """
+        Removes the value closest to expiring. Returns false if the heap entry was stale and nothing was removed.
+        """
+        expiry, name = heapq.heappop(self._expiry_heap)
+        current = self._values.get(name)
+        if current is None or current[1] != expiry:
+            return False
+
+        del self._values[name]
+        return True
+
+
+def _sweep_periodically(backend_ref: "weakref.ref[MemoryBackend]", interval: float) -> None:
+    # only a weak reference is held between sweeps, so the thread stops once the backend is no longer used.
+    while True:
+        time.sleep(interval)
+        backend = backend_ref()
+        if backend is None:
+            return
+        backend.sweep()
+        del backend
+
+
+class PostgresBackend(StorageBackend):
+    """
+    Keeps values in the unlogged `storage` table, shared by all processes using the same database.
+    Expired rows are ignored on read and deleted periodically on write.
+    """
+
+    def __init__(self, cleanup_interval: float = 60) -> None:
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0.0
+
+    def get(self, name: str) -> Optional[str]:
+        return db.sqla.engine.execute(
+            text("SELECT value FROM storage WHERE name = :name AND expires_at >= :now"),
+            name=name,
+            now=time.time(),
+        ).scalar()
+
+    def set(self, name: str, value: str, expiry: float) -> None:
+        now = time.time()
+        with db.sqla.engine.begin() as connection:
+            connection.execute(
+                text(
+                    "INSERT INTO storage (name, value, expires_at) VALUES (:name, :value, :expiry) "
+                    "ON CONFLICT (name) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at"
+                ),
+                name=name,
+                value=value,
+                expiry=expiry,
+            )
+            if now - self._last_cleanup > self.cleanup_interval:
+                self._last_cleanup = now
+                connection.execute(text("DELETE FROM storage WHERE expires_at < :now"), now=now)
+
+
+class CachedBackend(StorageBackend):
+    """
+    Caches reads from another backend in-process for a short time. Writes go straight through to the other backend.
+    """
+
+    def __init__(self, backend: StorageBackend, ttl: float, maxsize: int = 10_000) -> None:
+        self.backend = backend
+        self._cache: TTLCache[str, tuple[Optional[str], float]] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[str]:
+        with self._lock:
+            cached = self._cache.get(name)
+
+        if cached is None:
+            value = self.backend.get(name)
+            # we don't know when a value read from the backend expires, so it lives for the cache TTL.
+            cached = (value, float("inf"))
+            with self._lock:
+                self._cache[name] = cached
+
+        value, expiry = cached
+        return value if expiry >= time.time() else None
+
+    def set(self, name: str, value: str, expiry: float) -> None:
+        self.backend.set(name, value, expiry)
+        with self._lock:
+            self._cache[name] = (value, expiry)
+
+
+def make_backend() -> StorageBackend:
+    """
+    Creates the storage backend chosen in settings.
+    """
+    backend: StorageBackend
+    if settings.storage_backend == "postgres":
+        backend = PostgresBackend()
+    else:
+        backend = MemoryBackend(max_keys=settings.storage_max_keys, sweep_interval=settings.storage_sweep_interval)
+
+    if settings.storage_cache_ttl:
+        backend = CachedBackend(backend, ttl=settings.storage_cache_ttl)
+
+    return backend
+
+
+_backend = make_backend()
+
+
+@metrics.stats_collector.register
+def _storage_metrics() -> Iterator[metrics.Metric]:
+    backend = _backend.backend if isinstance(_backend, CachedBackend) else _backend
+    if not isinstance(backend, MemoryBackend):
+        return
+
+    stats = backend.stats()
+    yield metrics.gauge("reflector_storage_live_keys", "Values held by the memory storage backend.", stats.live_keys)
+    yield metrics.counter("reflector_storage_expirations", "Stored values removed after expiring.", stats.expirations)
+    yield metrics.counter(
+        "reflector_storage_evictions", "Stored values evicted because `storage_max_keys` was reached.", stats.evictions
+    )
+
+
+class GlobalStorage:
+    """
+    A simple key-value store with expiry times, backed by the configured storage backend.
+    """
+
+    def get(self, name: str) -> Optional[str]:
+        """Attempt to retrieve a value from the store."""
+        return _backend.get(name)
+
     def set(self, name: str, value: str, expiry: float) -> None:
         """Set a value in the store with an expiry timestamp."""
-        _global_storage[name] = (value, expiry)
+        _backend.set(name, value, expiry)
 
     def __getattr__(self, name: str) -> Optional[str]:
         """Enables dot notation for getting values from the store for template rendering."""
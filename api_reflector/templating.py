@@ -25,10 +25,18 @@ Some usage examples:
 >>> {{ uuid() }}
 a2dbcb56-161f-46ec-a8df-672b27c27281
 """
+import hashlib
+import threading
+from typing import Iterator, Optional
 from uuid import uuid4
 
 import pendulum
-from jinja2 import Environment
+from cachetools import LRUCache
+from jinja2 import BytecodeCache, Environment, FileSystemBytecodeCache, Template, nodes
+from jinja2.exceptions import TemplateSyntaxError
+
+from api_reflector import metrics
+from settings import settings
 
 
 def in_tz(datetime: pendulum.DateTime, timezone: str) -> pendulum.DateTime:
@@ -52,6 +60,134 @@ template_env.filters["naive"] = naive
 template_env.filters["dtformat"] = dtformat
 
 
+class TemplateCache:
+    """
+    A bounded LRU cache of compiled templates, keyed by template source.
+    If a bytecode cache is given, compiled code is shared through it so that new processes can skip compilation.
+    """
+
+    def __init__(self, env: Environment, maxsize: int, bytecode_cache: Optional[BytecodeCache] = None) -> None:
+        self.env = env
+        self.bytecode_cache = bytecode_cache
+        self.hits = 0
+        self.misses = 0
+        self._templates: LRUCache[str, Template] = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def get(self, source: str) -> Template:
+        """
+        Returns the compiled template for the given source, compiling it if it is not already cached.
+        """
+        with self._lock:
+            template = self._templates.get(source)
+            if template is not None:
+                self.hits += 1
+                return template
+            self.misses += 1
+
+        template = self._compile(source)
+
+        with self._lock:
+            self._templates[source] = template
+        return template
+
+    def clear(self) -> None:
+        """
+        Removes all compiled templates from the cache and resets the hit/miss counters.
+        """
+        with self._lock:
+            self._templates.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def _compile(self, source: str) -> Template:
+        if self.bytecode_cache is None:
+            return self.env.from_string(source)
+
+        # this mirrors what jinja's loaders do, with the source hash standing in for the template name.
+        name = hashlib.sha1(source.encode()).hexdigest()
+        bucket = self.bytecode_cache.get_bucket(self.env, name, None, source)
+        if bucket.code is None:
+            bucket.code = self.env.compile(source, name)
+            self.bytecode_cache.set_bucket(bucket)
+
+        return self.env.template_class.from_code(self.env, bucket.code, self.env.make_globals(None))
+
+
+def _make_bytecode_cache() -> Optional[BytecodeCache]:
+    if settings.template_bytecode_cache_path is None:
+        return None
+
+    settings.template_bytecode_cache_path.mkdir(parents=True, exist_ok=True)
+    return FileSystemBytecodeCache(str(settings.template_bytecode_cache_path))
+
+
+template_cache = TemplateCache(
+    template_env, maxsize=settings.template_cache_size, bytecode_cache=_make_bytecode_cache()
+)
+
+
+@metrics.stats_collector.register
+def _template_cache_metrics() -> Iterator[metrics.Metric]:
+    yield metrics.gauge("reflector_template_cache_size", "Compiled templates held in memory.", len(template_cache))
+    yield metrics.counter(
+        "reflector_template_cache_hits", "Templates found in the template cache.", template_cache.hits
+    )
+    yield metrics.counter(
+        "reflector_template_cache_misses", "Templates compiled because they weren't cached.", template_cache.misses
+    )
+
+
+def compile_template(source: str) -> Template:
+    """
+    Returns a compiled template for the given source from the template cache.
+    """
+    return template_cache.get(source)
+
+
+# the fields of the `request` object available to templates.
+REQUEST_FIELDS = frozenset(("params", "json", "query", "headers"))
+
+
+def referenced_request_fields(source: str) -> frozenset[str]:
+    """
+    Returns the fields of `request` that the given template source reads, such as `json` for `{{ request.json.id }}`.
+    If the template uses `request` in any way other than reading one of its fields by name, or can't be parsed, every
+    field is assumed to be needed.
+    """
+    if "request" not in source:
+        return frozenset()
+
+    try:
+        tree = template_env.parse(source)
+    except TemplateSyntaxError:
+        return REQUEST_FIELDS
+
+    fields = set()
+    field_accesses = set()
+    for node in tree.find_all((nodes.Getattr, nodes.Getitem)):
+        assert isinstance(node, (nodes.Getattr, nodes.Getitem))
+        if not (isinstance(node.node, nodes.Name) and node.node.name == "request"):
+            continue
+
+        if isinstance(node, nodes.Getattr):
+            fields.add(node.attr)
+        elif isinstance(node.arg, nodes.Const):
+            fields.add(node.arg.value)
+        else:
+            return REQUEST_FIELDS
+        field_accesses.add(id(node.node))
+
+    # any other use of `request`, such as `{{ request }}` or `{% set r = request %}`, could read anything.
+    if any(name.name == "request" and id(name) not in field_accesses for name in tree.find_all(nodes.Name)):
+        return REQUEST_FIELDS
+
+    return REQUEST_FIELDS & fields
+
+
 default_context = {
     # datetime utilities
     "now": lambda: pendulum.now("UTC"),
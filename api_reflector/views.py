@@ -1,57 +1,71 @@
 """
 Defines the project's API endpoints.
 """
-from typing import Any, Mapping, Union
+import time
+from functools import wraps
+from typing import Any, Mapping, Optional, Union
 
 import psycopg2
-from flask import Blueprint, Response, request
+from flask import Blueprint, Response, request, stream_with_context
 from flask_admin.base import render_template
 from jinja2.exceptions import TemplateError, TemplateSyntaxError, UndefinedError
-from werkzeug.routing import Map, Rule
-
-from api_reflector import db, models, rules_engine
+from werkzeug import wrappers
+from werkzeug.exceptions import HTTPException
+
+from api_reflector import (
+    compression,
+    config_io,
+    db,
+    journal,
+    metrics,
+    models,
+    notifications,
+    pipeline,
+    rules_engine,
+    scenarios,
+)
 from api_reflector.auth import requires_auth
 from api_reflector.endpoint import ensure_leading_slash
 from api_reflector.reporting import get_logger
-from api_reflector.templating import default_context, template_env
+from api_reflector.snapshot import EndpointSnapshot, config_store
+from settings import settings
 
 api = Blueprint("api", __name__)
 log = get_logger(__name__)
 
 
-def match_endpoint(path: str) -> tuple[models.Endpoint, Mapping[str, Any]]:
+def match_endpoint(path: str, timings: Optional[dict[str, float]] = None) -> tuple[EndpointSnapshot, Mapping[str, Any]]:
     """
-    Uses werkzeug routing to match the given path to an endpoint.
+    Uses the routing table of the current configuration snapshot to match the given path to an endpoint.
     Returns the matched endpoint as well as a mapping of URL parameters passed to the endpoint.
     If no endpoint was matched, raises a NotFound exception.
     """
 
-    log.debug(f"Matching path `{path}`")
+    log.debug("Matching path `%s`", path)
 
-    endpoints: list[models.Endpoint] = models.Endpoint.query.filter(
-        models.Endpoint.method == request.method.upper()
-    ).all()
+    with metrics.timed("match_endpoint", timings):
+        return config_store.current().match(request.method, path)
 
-    rules = [Rule(endpoint.path, endpoint=endpoint, methods=[request.method]) for endpoint in endpoints]
-    urls = Map(rules).bind("localhost")
 
-    # we're disabling mypy here because you're supposed to get strings back from `match`, not full endpoint objects.
-    return urls.match(path, method=request.method)  # type: ignore
+def requires_database(view_function):
+    """
+    Flask view function decorator for views that need the database.
+    When serving from a manifest there is no database, so these views respond with a 404 instead.
+    """
 
+    @wraps(view_function)
+    def decorator(*args, **kwargs):
+        if settings.manifest_path is not None:
+            return Response("Not available when serving mocks from a manifest.", status=404, mimetype="text/plain")
+        return view_function(*args, **kwargs)
 
-def _process_error_response(ex: Union[UndefinedError, TemplateSyntaxError, TemplateError]) -> Response:
-    """Returns the error response for Jinja exceptions"""
+    return decorator
 
-    if isinstance(ex, UndefinedError):
-        msg = "Undefined field used in the response template"
-    elif isinstance(ex, TemplateSyntaxError):
-        msg = "Syntax error in response template"
-    else:
-        msg = "Failed to render fields in the response template"
 
-    error_content = f"{msg}. Details: {ex}"
+def _process_error_response(ex: Union[UndefinedError, TemplateSyntaxError, TemplateError]) -> Response:
+    """Returns the error response for Jinja exceptions"""
 
-    return Response(error_content, status=500, mimetype="text/plain")
+    return Response(pipeline.template_error_message(ex), status=500, mimetype="text/plain")
 
 
 @api.route("/healthz")
@@ -68,15 +82,31 @@ def readyz() -> tuple[Any, int]:
     """
     Returns a 204 OK response if services are accessible, 500 otherwise.
     """
+    if settings.manifest_path is not None:
+        # the manifest was loaded on startup, so there's nothing else to check.
+        return "", 204
+
     try:
         db.sqla.engine.execute("SELECT 1").fetchone()
+        if settings.postgres_replica_dsn is not None:
+            db.read_engine().execute("SELECT 1").fetchone()
     except psycopg2.Error as ex:
         return f"Database is not accessible.\nException:\n\n{ex}", 500
     return "", 204
 
 
+@api.route("/metrics")
+def prometheus_metrics() -> Response:
+    """
+    Returns metrics in the prometheus text format.
+    """
+    data, content_type = metrics.generate()
+    return Response(data, content_type=content_type)
+
+
 @api.route("/")
 @requires_auth
+@requires_database
 def home() -> tuple[Any, int]:
     """
     Renders the home page.
@@ -86,56 +116,124 @@ def home() -> tuple[Any, int]:
     return render_template("home.html", endpoints=endpoints, tags=tags), 200
 
 
+@api.route("/api/config")
+@requires_auth
+@requires_database
+def export_config() -> Response:
+    """
+    Streams the whole mock configuration as JSON, or as YAML with `?format=yaml`.
+    """
+    fmt = request.args.get("format", "json")
+    if fmt not in config_io.FORMATS:
+        return Response(f"Unknown format `{fmt}`", status=400, mimetype="text/plain")
+
+    def generate():
+        with db.sqla.engine.connect() as connection:
+            yield from config_io.export_config(connection, fmt)
+
+    return Response(stream_with_context(generate()), mimetype=config_io.MIMETYPES[fmt])
+
+
+@api.route("/api/config", methods=["POST"])
+@requires_auth
+@requires_database
+def import_config() -> Union[Response, tuple[Any, int]]:
+    """
+    Upserts the mock configuration from a JSON or YAML request body.
+    YAML is expected if the content type or the `format` query parameter says so.
+    """
+    fmt = request.args.get("format") or ("yaml" if "yaml" in request.mimetype else "json")
+    try:
+        config = config_io.parse(request.get_data(), fmt)
+    except ValueError as ex:
+        return Response(f"Invalid configuration: {ex}", status=400, mimetype="text/plain")
+
+    with db.sqla.engine.connect() as connection:
+        summary = config_io.import_config(connection, config)
+    notifications.config_changed()
+
+    return summary._asdict(), 200
+
+
+@api.route("/api/scenarios/<name>", methods=["POST"])
+@requires_auth
+@requires_database
+def activate_scenario(name: str) -> Union[Response, tuple[Any, int]]:
+    """
+    Activates the responses tagged with the given tag, and deactivates the other responses of their endpoints.
+    """
+    try:
+        with db.sqla.engine.connect() as connection:
+            summary = scenarios.activate_scenario(connection, name)
+    except LookupError as ex:
+        return Response(str(ex), status=404, mimetype="text/plain")
+    config_store.apply_active(summary.changes)
+    notifications.publish(summary.endpoints)
+
+    return summary._asdict(), 200
+
+
 @api.route("/mock/<path:path>", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
-def mock(path: str) -> Response:
+def mock(path: str) -> wrappers.Response:
     """
     Mock endpoint. Tries to map the given path to a configured mock.
     """
 
+    start = time.perf_counter()
+    endpoint_label = metrics.UNMATCHED
+    status = 500
+    trace = journal.Trace()
     path = ensure_leading_slash(path)
-    endpoint, params = match_endpoint(path)  # pylint: disable=unpacking-non-sequence
-
-    log.info(f"Matched `{path}` to endpoint: {endpoint}")
-
-    active_responses = [response for response in endpoint.responses if response.is_active]
-
-    if not active_responses:
-        return Response("No Mock Responses configured or active for this endpoint", status=501)
-
-    response_rules = [
-        (
-            response,
-            [
-                rules_engine.ScoringRule(
-                    operator=rule.operator,
-                    arguments=rule.arguments,
-                )
-                for rule in response.rules
-            ],
-        )
-        for response in active_responses
-    ]
-
-    if request.is_json:
+    try:
+        endpoint, params = match_endpoint(path, trace.timings)  # pylint: disable=unpacking-non-sequence
+        endpoint_label = metrics.endpoint_label(endpoint)
+        trace.endpoint_id = endpoint.id
+
+        log.info("Matched `%s` to endpoint: %s", path, endpoint)
+
+        response = _serve_mock(endpoint, params, trace)
+        status = response.status_code
+        return response
+    except HTTPException as ex:
+        status = ex.code or status
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        metrics.observe_request(endpoint_label, request.method, status, duration)
+        if settings.journal_enabled:
+            journal.request_journal.record(
+                journal.make_hit(request.method, path, request.headers, request.get_data(), status, duration, trace)
+            )
+
+
+def _serve_mock(endpoint: EndpointSnapshot, params: Mapping[str, Any], trace: journal.Trace) -> wrappers.Response:
+    # the body and query string are only parsed if one of the endpoint's responses reads them.
+    if request.is_json and "json" in endpoint.request_fields:
         req_json = request.json  # type: Any
     else:
         req_json = {}
 
     templateable_request = rules_engine.TemplatableRequest(
-        params=params, json=req_json, query=request.args, headers=request.headers
+        params=params,
+        json=req_json,
+        query=request.args if "query" in endpoint.request_fields else pipeline.EMPTY_QUERY,
+        headers=request.headers,
     )
 
     try:
-        response = rules_engine.find_best_response(templateable_request, response_rules)
-        content = template_env.from_string(response.content).render(
-            {
-                "request": templateable_request,
-                **default_context,
-            }
-        )
-        response.execute_actions(req_json, content)
-
-    except (UndefinedError, TemplateSyntaxError, TemplateError) as ex:
+        response = pipeline.choose_response(endpoint, templateable_request, trace.timings)
+        if response is None:
+            return Response(pipeline.NO_ACTIVE_RESPONSES, status=501)
+        trace.response_id = response.id
+
+        body, content = pipeline.render_body(response, templateable_request, trace.timings)
+
+        with metrics.timed("execute_actions", trace.timings):
+            response.execute_actions(req_json, content)
+
+    except pipeline.TEMPLATE_ERRORS as ex:
         return _process_error_response(ex)
 
-    return Response(content, status=response.status_code, mimetype=response.content_type)
+    if isinstance(body, (bytes, str)):
+        return compression.build_response(response, body, request.method, request.headers)
+    return Response(stream_with_context(body), status=response.status_code, mimetype=response.content_type)
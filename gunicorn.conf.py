@@ -0,0 +1,3 @@
+# gunicorn loads this file automatically from the working directory.
+# pylint: disable=unused-import
+from api_reflector.metrics import child_exit  # noqa: F401
@@ -1,6 +1,6 @@
 import logging
 from pathlib import Path
-from typing import Any, Mapping, Optional
+from typing import Any, Literal, Mapping, Optional
 
 from pydantic import BaseSettings, PostgresDsn, validator
 
@@ -15,11 +15,35 @@ class Settings(BaseSettings):
     use_x_forwarded_host: bool = False
     use_x_forwarded_proto: bool = False
 
-    postgres_dsn: PostgresDsn
+    # if set, mocks are served from this JSON or YAML manifest instead of the database, which is then not needed.
+    # the admin, the journal and the configuration & scenario APIs are unavailable in this mode.
+    manifest_path: Optional[Path] = None
+    # in seconds. how often the manifest is checked for changes.
+    manifest_poll_interval: float = 1
+
+    # required unless `manifest_path` is set.
+    postgres_dsn: Optional[PostgresDsn] = None
     postgres_engine_options: dict = {"connect_args": {"application_name": "api-reflector"}}
+    # if set, the mock configuration is loaded from this read replica, so mock traffic doesn't use the primary's
+    # connections. admin and API writes still go to `postgres_dsn`.
+    postgres_replica_dsn: Optional[PostgresDsn] = None
+    # passed to `create_engine` for the replica, for example to size its pool or its compiled statement cache.
+    postgres_replica_engine_options: dict = {
+        "pool_size": 5,
+        "pool_pre_ping": True,
+        "query_cache_size": 500,
+        "connect_args": {"application_name": "api-reflector-replica"},
+    }
 
     log_json: bool = True
     log_level: str = "info"
+    # if enabled, log records are written by a background thread instead of by the thread that logs them.
+    log_async: bool = True
+    # log records are dropped if this many are already waiting to be written.
+    log_queue_size: int = 10_000
+    # maps logger names to the fraction of their debug and info records to keep, for example
+    # `{"api_reflector.views": 0.01}` to log one in a hundred mock requests. warnings and errors are always kept.
+    log_sample_rates: dict[str, float] = {}
 
     sentry_dsn: Optional[str]
 
@@ -29,9 +53,65 @@ class Settings(BaseSettings):
     maximum_delay_length: Optional[float] = None
 
     lockfile_path: Path = Path("/tmp/.api-reflector.lock")
+    # if disabled, migrations must be run separately with `api-reflector-migrate`.
+    migrate_on_startup: bool = True
 
     # in seconds.
     storage_expiry: int = 15
+    # "memory" keeps stored values per-process, "postgres" shares them between all workers and pods.
+    storage_backend: Literal["memory", "postgres"] = "memory"
+    # the memory backend evicts the values closest to expiring if it holds more than this many.
+    storage_max_keys: int = 100_000
+    # in seconds. how often the memory backend removes expired values.
+    storage_sweep_interval: float = 1
+    # in seconds. if set, stored values are cached in-process for this long.
+    storage_cache_ttl: float = 0
+
+    # callbacks are sent in the background by this many threads per process.
+    callback_concurrency: int = 4
+    # callbacks are dropped if this many are already waiting to be sent.
+    callback_queue_size: int = 1000
+    callback_max_retries: int = 3
+    # in seconds. doubled after each retry.
+    callback_retry_backoff: float = 0.5
+    # in seconds.
+    callback_timeout: float = 5
+
+    # if enabled, configuration changes are sent to every other worker and pod with postgres LISTEN/NOTIFY, and each
+    # of them reloads the changed endpoints. otherwise each process only sees its own changes.
+    config_notifications_enabled: bool = True
+    # in seconds. how long to wait before listening again after losing the connection.
+    config_notifications_reconnect_interval: float = 5
+
+    # if enabled, every mock request is recorded in the `journal_entry` table.
+    journal_enabled: bool = True
+    # the journal buffers at most this many unwritten requests per process, dropping the oldest when full.
+    journal_capacity: int = 10_000
+    journal_batch_size: int = 500
+    # in seconds. how often buffered requests are written to the database.
+    journal_flush_interval: float = 1
+    # in seconds. older journal entries are deleted. if unset, entries are kept forever.
+    journal_retention: Optional[float] = 86_400
+    # request bodies longer than this many characters are truncated in the journal.
+    journal_max_body_length: int = 65_536
+    # the values of these request headers are replaced with `[redacted]` in the journal, so that credentials aren't
+    # stored. names are case-insensitive.
+    journal_redacted_headers: frozenset[str] = frozenset(
+        ("authorization", "cookie", "proxy-authorization", "x-api-key")
+    )
+
+    # if enabled, mock responses are compressed with gzip or deflate when the client accepts it.
+    compression_enabled: bool = True
+    # in bytes. smaller responses aren't worth compressing.
+    compression_min_size: int = 1024
+    compression_level: int = 6
+    # in bytes. compressed static responses are cached in memory up to this total size per process.
+    compression_cache_size: int = 64 * 1024 * 1024
+
+    # maximum number of compiled templates kept in memory per process.
+    template_cache_size: int = 4096
+    # if set, compiled template bytecode is also cached in this directory and shared between processes.
+    template_bytecode_cache_path: Optional[Path] = None
 
     @validator("azure_client_id", "azure_client_secret", "azure_tenant")
     @classmethod
@@ -40,6 +120,37 @@ class Settings(BaseSettings):
             raise ValueError("Azure auth details must be provided when auth is enabled")
         return v
 
+    @validator("postgres_dsn", always=True)
+    @classmethod
+    def database_unless_manifest(cls, v: Optional[str], values: Mapping[str, Any]) -> Optional[str]:
+        if values.get("manifest_path") is None and not v:
+            raise ValueError("postgres_dsn must be provided unless serving from a manifest")
+        return v
+
+    @validator("journal_enabled")
+    @classmethod
+    def no_journal_with_manifest(cls, v: bool, values: Mapping[str, Any]) -> bool:
+        # the journal is written to the database, so it's always disabled when serving from a manifest.
+        return v and values.get("manifest_path") is None
+
+    @validator("journal_redacted_headers")
+    @classmethod
+    def lowercase_redacted_headers(cls, v: frozenset[str]) -> frozenset[str]:
+        return frozenset(name.lower() for name in v)
+
+    @validator("config_notifications_enabled")
+    @classmethod
+    def no_notifications_with_manifest(cls, v: bool, values: Mapping[str, Any]) -> bool:
+        # notifications are sent through the database, and a manifest has its own way of reloading.
+        return v and values.get("manifest_path") is None
+
+    @validator("storage_backend")
+    @classmethod
+    def no_postgres_storage_with_manifest(cls, v: str, values: Mapping[str, Any]) -> str:
+        if v == "postgres" and values.get("manifest_path") is not None:
+            raise ValueError("the postgres storage backend can't be used when serving from a manifest")
+        return v
+
     @validator("log_level")
     @classmethod
     def validate_log_level(cls, value: str) -> str:
@@ -50,5 +161,14 @@ class Settings(BaseSettings):
 
         return v
 
+    @property
+    def database_url(self) -> str:
+        """
+        The postgres DSN, for commands that can't run without a database.
+        """
+        if self.postgres_dsn is None:
+            raise ValueError("postgres_dsn must be set to use the database")
+        return self.postgres_dsn
+
 
 settings = Settings()
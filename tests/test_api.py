@@ -0,0 +1,21 @@
+"""Unit tests for the flask application setup."""
+
+import re
+
+from api_reflector.api import StartupTimer
+
+
+def test_startup_timer():
+    """Test that each phase is timed separately, including phases that raise, and reported in order"""
+    timer = StartupTimer()
+    with timer.phase("gevent"):
+        pass
+    try:
+        with timer.phase("app"):
+            raise RuntimeError
+    except RuntimeError:
+        pass
+
+    assert list(timer.phases) == ["gevent", "app"]
+    assert all(duration >= 0 for duration in timer.phases.values())
+    assert re.fullmatch(r"[\d.]+ms \(gevent: [\d.]+ms, app: [\d.]+ms\)", timer.report())
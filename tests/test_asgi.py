@@ -0,0 +1,185 @@
+"""Unit tests for the ASGI mock pipeline."""
+
+import asyncio
+import json
+
+import pytest
+from flask import Flask
+
+from api_reflector import asgi, manifest, views
+from api_reflector.config_io import parse
+from api_reflector.snapshot import ConfigStore
+from settings import settings
+
+MANIFEST = """
+endpoints:
+  - name: users
+    method: GET
+    path: users/<user_id>
+    responses:
+      - name: default
+        content: '{"id": "{{ request.params.user_id }}", "q": "{{ request.query.q }}"}'
+      - name: special
+        content: '{"special": true}'
+        rules:
+          - operator: EQUAL
+            arguments: ["{{ request.params.user_id }}", "42"]
+  - name: echo
+    method: POST
+    path: echo
+    responses:
+      - name: echo
+        content: '{"name": "{{ request.json.name }}"}'
+  - name: slow
+    method: GET
+    path: slow
+    responses:
+      - name: slow
+        content: done
+        actions:
+          - action: DELAY
+            arguments: ["2.5"]
+  - name: stream
+    method: GET
+    path: stream
+    responses:
+      - name: stream
+        stream: true
+        content: '{% for n in range(3) %}{{ "x" * 10000 }}{% endfor %}'
+"""
+
+
+@pytest.fixture(name="flask_app")
+def fixture_flask_app(monkeypatch):
+    """A flask app serving the mock views from the manifest above, without a database"""
+    store = ConfigStore()
+    store.publish(manifest.build_endpoints(parse(MANIFEST, "yaml")))
+    monkeypatch.setattr(asgi, "config_store", store)
+    monkeypatch.setattr(views, "config_store", store)
+    monkeypatch.setattr(settings, "journal_enabled", False)
+
+    app = Flask(__name__)
+    app.register_blueprint(views.api)
+    return app
+
+
+def call(app: asgi.MockASGIApp, method: str, path: str, body: bytes = b"", headers=(), query: bytes = b""):
+    """Calls the given ASGI app with a single request, and returns the status, headers and every body message"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query,
+        "headers": [(key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in headers],
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 12345),
+    }
+    # split in two, to check that the body is read in full.
+    requests = [
+        {"type": "http.request", "body": body[:1], "more_body": True},
+        {"type": "http.request", "body": body[1:], "more_body": False},
+    ]
+    sent = []
+
+    async def receive():
+        return requests.pop(0) if requests else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start, *bodies = sent
+    assert start["type"] == "http.response.start"
+    return start["status"], {key.decode(): value.decode() for key, value in start["headers"]}, bodies
+
+
+def test_matched_routes(flask_app):
+    """Test that mocks are matched, scored and rendered the same way as by the flask view"""
+    app = asgi.MockASGIApp(flask_app)
+    client = flask_app.test_client()
+
+    for path, query in (("/mock/users/1", b"q=a%20b"), ("/mock/users/42", b"")):
+        status, headers, bodies = call(app, "GET", path, query=query)
+        expected = client.get(path, query_string=query.decode())
+        assert status == expected.status_code == 200
+        assert b"".join(message["body"] for message in bodies) == expected.get_data()
+        assert headers["etag"] == expected.headers["ETag"]
+        assert headers["access-control-allow-origin"] == "*"
+
+    _, _, bodies = call(app, "GET", "/mock/users/1", query=b"q=a%20b")
+    assert json.loads(bodies[0]["body"]) == {"id": "1", "q": "a b"}
+
+
+def test_unmatched_routes(flask_app):
+    """Test that requests for unknown endpoints or methods get a 404 like the flask view"""
+    app = asgi.MockASGIApp(flask_app)
+    client = flask_app.test_client()
+
+    for method, path in (("GET", "/mock/nothing"), ("POST", "/mock/users/1")):
+        status, _, _ = call(app, method, path)
+        assert status == client.open(path, method=method).status_code == 404
+
+
+def test_json_bodies(flask_app):
+    """Test that JSON bodies are decoded, and malformed JSON is rejected with a 400 like the flask view"""
+    app = asgi.MockASGIApp(flask_app)
+    client = flask_app.test_client()
+    headers = [("Content-Type", "application/json; charset=utf-8")]
+
+    status, _, bodies = call(app, "POST", "/mock/echo", body=b'{"name": "bob"}', headers=headers)
+    assert status == 200
+    assert json.loads(bodies[0]["body"]) == {"name": "bob"}
+
+    status, _, _ = call(app, "POST", "/mock/echo", body=b'{"name": ', headers=headers)
+    assert status == client.post("/mock/echo", data=b'{"name": ', headers=headers).status_code == 400
+
+    # bodies that aren't JSON aren't decoded.
+    status, _, bodies = call(app, "POST", "/mock/echo", body=b"name=bob", headers=[("Content-Type", "text/plain")])
+    assert status == 200
+    assert json.loads(bodies[0]["body"]) == {"name": ""}
+
+
+def test_delay_is_awaited(flask_app, monkeypatch):
+    """Test that DELAY actions suspend the request on the event loop instead of blocking it"""
+    slept = []
+
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+
+    def blocking_sleep(_seconds):
+        raise AssertionError("DELAY blocked the event loop")
+
+    monkeypatch.setattr(asgi.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr("api_reflector.actions.time.sleep", blocking_sleep)
+
+    status, _, bodies = call(asgi.MockASGIApp(flask_app), "GET", "/mock/slow")
+    assert status == 200
+    assert bodies[0]["body"] == b"done"
+    assert slept == [2.5]
+
+
+def test_streamed_responses(flask_app):
+    """Test that streamed responses are sent in several body messages"""
+    status, _, bodies = call(asgi.MockASGIApp(flask_app), "GET", "/mock/stream")
+    assert status == 200
+    assert len(bodies) > 2
+    assert all(message["more_body"] for message in bodies[:-1])
+    assert bodies[-1] == {"type": "http.response.body", "body": b""}
+    assert b"".join(message["body"] for message in bodies) == b"x" * 30000
+
+
+def test_pass_through(flask_app):
+    """Test that everything other than mock requests is passed through to the flask app"""
+    app = asgi.MockASGIApp(flask_app)
+
+    status, _, _ = call(app, "GET", "/healthz")
+    assert status == 204
+
+    # methods the mock view doesn't accept are left to flask, too.
+    status, _, _ = call(app, "OPTIONS", "/mock/users/1")
+    assert status == flask_app.test_client().options("/mock/users/1").status_code
@@ -0,0 +1,70 @@
+"""Unit tests for the callback dispatcher."""
+
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from api_reflector.callbacks import CallbackDispatcher
+
+
+def serve(statuses: list[int], received: list[bytes]) -> HTTPServer:
+    """Starts a local server that responds with the given status codes in order"""
+
+    class Handler(BaseHTTPRequestHandler):
+        """Records request bodies"""
+
+        def do_POST(self):  # pylint: disable=invalid-name
+            """Handles a callback"""
+            received.append(self.rfile.read(int(self.headers["Content-Length"])))
+            self.send_response(statuses.pop(0) if statuses else 200)
+            self.end_headers()
+
+        def log_message(self, *_args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_dispatcher(**kwargs) -> CallbackDispatcher:
+    """Builds a dispatcher with fast retries"""
+    options = {"concurrency": 2, "queue_size": 10, "max_retries": 2, "retry_backoff": 0, "timeout": 1, **kwargs}
+    return CallbackDispatcher(**options)
+
+
+def test_dispatcher_delivers_and_retries():
+    """Test that callbacks are delivered, retrying server errors"""
+    received: list[bytes] = []
+    server = serve([503], received)
+    dispatcher = make_dispatcher()
+
+    assert dispatcher.submit(f"http://127.0.0.1:{server.server_port}/cb", '{"a": "b"}')
+    dispatcher.join()
+    server.shutdown()
+
+    assert received == [b'{"a": "b"}', b'{"a": "b"}']
+    stats = dispatcher.stats()
+    assert (stats.enqueued, stats.delivered, stats.retries, stats.failed) == (1, 1, 1, 0)
+
+
+def test_dispatcher_gives_up():
+    """Test that callbacks are abandoned after the maximum number of retries"""
+    received: list[bytes] = []
+    server = serve([500, 500, 500], received)
+    dispatcher = make_dispatcher()
+
+    dispatcher.submit(f"http://127.0.0.1:{server.server_port}/cb", "{}")
+    dispatcher.join()
+    server.shutdown()
+
+    assert len(received) == 3
+    assert dispatcher.stats().failed == 1
+
+
+def test_dispatcher_drops_when_full():
+    """Test that callbacks are dropped when the queue is full"""
+    dispatcher = make_dispatcher(concurrency=0, queue_size=1)
+
+    assert dispatcher.submit("http://127.0.0.1:1/cb", "{}")
+    assert not dispatcher.submit("http://127.0.0.1:1/cb", "{}")
+    assert dispatcher.stats().dropped == 1
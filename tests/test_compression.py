@@ -0,0 +1,110 @@
+"""Unit tests for response compression and conditional requests."""
+
+import gzip
+import zlib
+
+import pytest
+
+from api_reflector.compression import build_response, compression_cache, negotiate
+from api_reflector.snapshot import ResponseSnapshot, encode_static, make_etag
+
+BIG_CONTENT = '{"items": [' + ", ".join(['{"n": 1}'] * 500) + "]}"
+
+
+def make_response(content: str = BIG_CONTENT, status_code: int = 200, static: bool = True) -> ResponseSnapshot:
+    """Builds a response with the given content, optionally pre-encoded"""
+    static_body = encode_static(content) if static else None
+    return ResponseSnapshot(
+        1,
+        "test",
+        status_code,
+        "application/json",
+        content,
+        True,
+        (),
+        (),
+        static_body=static_body,
+        static_etag=None if static_body is None else make_etag(static_body),
+    )
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("", None),
+        ("gzip, deflate, br", "gzip"),
+        ("deflate", "deflate"),
+        ("gzip;q=0.5, deflate", "deflate"),
+        ("gzip;q=0, identity", None),
+        ("*", "gzip"),
+        ("br", None),
+    ],
+)
+def test_negotiate(header, expected):
+    """Test that the preferred accepted content coding is chosen"""
+    assert negotiate(header) == expected
+
+
+@pytest.mark.parametrize("static", [True, False])
+def test_build_response_compresses(static):
+    """Test that large bodies are compressed when the client accepts it"""
+    compression_cache.clear()
+    response = make_response(static=static)
+
+    gzipped = build_response(response, BIG_CONTENT, "GET", {"Accept-Encoding": "gzip"})
+    deflated = build_response(response, BIG_CONTENT, "GET", {"Accept-Encoding": "deflate"})
+    plain = build_response(response, BIG_CONTENT, "GET", {})
+
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(gzipped.get_data()).decode() == BIG_CONTENT
+    assert zlib.decompress(deflated.get_data()).decode() == BIG_CONTENT
+    assert "Content-Encoding" not in plain.headers
+    assert plain.get_data().decode() == BIG_CONTENT
+    assert len({gzipped.get_etag()[0], deflated.get_etag()[0], plain.get_etag()[0]}) == 3
+    assert "Accept-Encoding" in plain.vary
+
+
+def test_build_response_skips_small_bodies():
+    """Test that small bodies aren't compressed"""
+    result = build_response(make_response("{}"), b"{}", "GET", {"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in result.headers
+    assert result.get_data() == b"{}"
+
+
+def test_build_response_not_modified():
+    """Test that a matching If-None-Match gets an empty 304 response"""
+    response = make_response()
+    etag, _ = build_response(response, BIG_CONTENT, "GET", {"Accept-Encoding": "gzip"}).get_etag()
+
+    result = build_response(response, BIG_CONTENT, "GET", {"Accept-Encoding": "gzip", "If-None-Match": f'"{etag}"'})
+    assert result.status_code == 304
+    assert result.get_data() == b""
+    assert result.get_etag() == (etag, False)
+
+    # the etag of one content coding doesn't match another.
+    result = build_response(response, BIG_CONTENT, "GET", {"If-None-Match": f'"{etag}"'})
+    assert result.status_code == 200
+
+    # proxies may weaken etags, which still match.
+    result = build_response(response, BIG_CONTENT, "HEAD", {"Accept-Encoding": "gzip", "If-None-Match": f'W/"{etag}"'})
+    assert result.status_code == 304
+
+
+def test_build_response_ignores_conditions_on_unsafe_methods():
+    """Test that If-None-Match only short-circuits GET & HEAD requests"""
+    response = make_response()
+    etag, _ = build_response(response, BIG_CONTENT, "POST", {}).get_etag()
+
+    for method in ("POST", "PUT", "PATCH", "DELETE"):
+        result = build_response(response, BIG_CONTENT, method, {"If-None-Match": f'"{etag}"'})
+        assert result.status_code == 200
+        assert result.get_data() == BIG_CONTENT.encode()
+
+
+def test_build_response_ignores_conditions_on_errors():
+    """Test that If-None-Match only applies to successful responses"""
+    response = make_response(status_code=404)
+    etag, _ = build_response(response, BIG_CONTENT, "GET", {}).get_etag()
+
+    assert build_response(response, BIG_CONTENT, "GET", {"If-None-Match": f'"{etag}"'}).status_code == 404
@@ -0,0 +1,77 @@
+"""Unit tests for configuration import and export documents."""
+
+import pytest
+
+from api_reflector.config_io import dump, parse
+from api_reflector.endpoint import Method
+from api_reflector.rules_engine import Operator
+
+ENDPOINTS = [
+    {
+        "name": "users",
+        "method": "GET",
+        "path": "/users/<user_id>",
+        "responses": [
+            {
+                "name": "special",
+                "status_code": 201,
+                "content_type": "application/json",
+                "content": '{"special": true}',
+                "is_active": True,
+                "tags": ["smoke"],
+                "rules": [{"operator": "EQUAL", "arguments": ["{{ request.params.user_id }}", "42"]}],
+                "actions": [{"action": "DELAY", "arguments": ["1"]}],
+            }
+        ],
+    },
+    {"name": "things", "method": "POST", "path": "/things", "responses": []},
+]
+
+
+@pytest.mark.parametrize("fmt", ["json", "yaml"])
+def test_dump_round_trip(fmt):
+    """Test that dumped documents parse back to the same configuration"""
+    config = parse("".join(dump(fmt, ["smoke"], iter(ENDPOINTS))), fmt)
+
+    assert config.tags == ["smoke"]
+    assert [endpoint.dict()["path"] for endpoint in config.endpoints] == ["/users/<user_id>", "/things"]
+    assert config.endpoints[0].method is Method.GET
+    assert config.endpoints[0].responses[0].rules[0].operator is Operator.EQUAL
+
+
+@pytest.mark.parametrize("fmt", ["json", "yaml"])
+def test_dump_empty(fmt):
+    """Test that an empty configuration can be dumped and parsed"""
+    config = parse("".join(dump(fmt, [], iter([]))), fmt)
+    assert (config.tags, config.endpoints) == ([], [])
+
+
+def test_parse_defaults():
+    """Test that optional fields get the same defaults as the models"""
+    config = parse("endpoints: [{name: a, method: GET, path: a, responses: [{name: r}]}]", "yaml")
+    response = config.endpoints[0].responses[0]
+
+    assert config.endpoints[0].path == "/a"
+    assert (response.status_code, response.content, response.is_active) == (200, "{}", True)
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        '{"endpoints": [{"name": "a", "method": "GET", "path": "/a"}, {"name": "b", "method": "GET", "path": "a"}]}',
+        '{"endpoints": [{"name": "a", "method": "TRACE", "path": "/a"}]}',
+        '{"endpoints": [{"name": "a", "method": "GET", "path": ""}]}',
+        '{"endpoints": [{"name": "a", "method": "GET", "path": "  "}]}',
+        '{"endpoints": [',
+    ],
+)
+def test_parse_invalid(document):
+    """Test that invalid documents are rejected"""
+    with pytest.raises(ValueError):
+        parse(document, "json")
+
+
+def test_parse_invalid_yaml():
+    """Test that malformed YAML is rejected"""
+    with pytest.raises(ValueError):
+        parse("endpoints: [", "yaml")
@@ -0,0 +1,16 @@
+"""Unit tests for database engines."""
+
+from api_reflector import db
+from settings import settings
+
+
+def test_read_engine_uses_replica(monkeypatch):
+    """Test that a configured replica gets its own engine, created once"""
+    monkeypatch.setattr(db, "_replica_engine", None)
+    monkeypatch.setattr(settings, "postgres_replica_dsn", "postgresql://reader:pw@replica:5432/reflector")
+    monkeypatch.setattr(settings, "postgres_replica_engine_options", {"pool_size": 3})
+
+    engine = db.read_engine()
+    assert engine.url.host == "replica"
+    assert engine.pool.size() == 3
+    assert db.read_engine() is engine
@@ -0,0 +1,93 @@
+"""Unit tests for the request journal."""
+
+from datetime import datetime, timezone
+
+from flask import Flask
+
+from api_reflector.journal import REDACTED, MockHit, RequestJournal, Trace, make_hit
+from settings import settings
+
+
+class MemoryJournal(RequestJournal):
+    """A journal that keeps written batches in memory instead of the database"""
+
+    def __init__(self, **kwargs) -> None:
+        options = {
+            "capacity": 3,
+            "batch_size": 2,
+            "flush_interval": 3600,
+            "retention": None,
+            "max_body_length": 10,
+            **kwargs,
+        }
+        super().__init__(**options)
+        self.batches: list[list[MockHit]] = []
+
+    def _write(self, batch: list[MockHit]) -> None:
+        self.batches.append(batch)
+
+
+def hit(path: str, body: str = "") -> MockHit:
+    """Builds a mock hit for the given path"""
+    return MockHit(datetime.now(timezone.utc), "GET", path, {}, body, None, None, 200, 0.001, {})
+
+
+def test_journal_writes_in_batches():
+    """Test that recorded hits are written in batches of the configured size"""
+    journal = MemoryJournal()
+    with Flask(__name__).app_context():
+        for i in range(3):
+            journal.record(hit(f"/{i}"))
+
+    assert journal.flush() == 3
+    assert [[h.path for h in batch] for batch in journal.batches] == [["/0", "/1"], ["/2"]]
+    assert journal.stats().written == 3
+
+
+def test_journal_drops_oldest_when_full():
+    """Test that the oldest hits are dropped and counted when the buffer overflows"""
+    journal = MemoryJournal()
+    with Flask(__name__).app_context():
+        for i in range(5):
+            journal.record(hit(f"/{i}"))
+
+    stats = journal.stats()
+    assert (stats.recorded, stats.dropped, stats.buffered) == (5, 2, 3)
+
+    journal.flush()
+    assert [h.path for batch in journal.batches for h in batch] == ["/2", "/3", "/4"]
+
+
+def test_journal_truncates_bodies():
+    """Test that long request bodies are truncated"""
+    journal = MemoryJournal()
+    with Flask(__name__).app_context():
+        journal.record(hit("/", body="x" * 100))
+
+    journal.flush()
+    assert journal.batches[0][0].body == "x" * 10
+
+
+def test_make_hit():
+    """Test that hits are built from the request and its trace"""
+    trace = Trace()
+    trace.endpoint_id, trace.response_id = 1, 2
+    trace.timings["render"] = 0.5
+
+    result = make_hit("POST", "/a", {"X-Test": "yes"}, b'{"a": 1}', 201, 1.5, trace)
+
+    assert (result.method, result.path, result.body, result.status_code) == ("POST", "/a", '{"a": 1}', 201)
+    assert (result.endpoint_id, result.response_id, result.timings) == (1, 2, {"render": 0.5})
+    assert result.headers == {"X-Test": "yes"}
+
+
+def test_make_hit_redacts_credentials(monkeypatch):
+    """Test that credential headers are redacted, and bodies are cut down before they're decoded"""
+    monkeypatch.setattr(settings, "journal_redacted_headers", frozenset(("authorization", "x-secret")))
+    monkeypatch.setattr(settings, "journal_max_body_length", 4)
+    headers = {"Authorization": "Bearer token", "X-SECRET": "shh", "Cookie": "a=b"}
+
+    result = make_hit("GET", "/a", headers, "ab€".encode(), 200, 0.1, Trace())
+
+    assert result.headers == {"Authorization": REDACTED, "X-SECRET": REDACTED, "Cookie": "a=b"}
+    assert result.body == "ab\ufffd"
@@ -0,0 +1,77 @@
+"""Unit tests for serving from a manifest file."""
+
+import os
+
+import pytest
+
+from api_reflector import manifest
+from api_reflector.actions import Action
+from api_reflector.config_io import parse
+from api_reflector.rules_engine import Operator
+from api_reflector.snapshot import ConfigStore
+
+MANIFEST = """
+endpoints:
+  - name: users
+    method: GET
+    path: users/<user_id>
+    responses:
+      - name: default
+        content: '{"id": "{{ request.params.user_id }}"}'
+      - name: special
+        content: '{"special": true}'
+        rules:
+          - operator: EQUAL
+            arguments: ["{{ request.params.user_id }}", "42"]
+          - operator: IS_NOT_EMPTY
+            arguments: ["{{ request.params.user_id }}"]
+        actions:
+          - action: DELAY
+            arguments: ["1"]
+"""
+
+
+def test_build_endpoints():
+    """Test that manifests are built into snapshots without a database"""
+    endpoints = manifest.build_endpoints(parse(MANIFEST, "yaml"))
+
+    (endpoint,) = endpoints.values()
+    assert (endpoint.id, endpoint.method, endpoint.path) == (1, "GET", "/users/<user_id>")
+    default, special = endpoint.responses
+    assert (default.id, special.id) == (1, 2)
+    assert [rule.operator for rule in special.rules] == [Operator.EQUAL, Operator.IS_NOT_EMPTY]
+    assert [action.action for action in special.actions] == [Action.DELAY]
+    assert endpoint.response_index is not None
+
+
+def test_watcher_reloads_changes(tmp_path, monkeypatch):
+    """Test that the manifest is published again when it changes, and invalid changes are ignored"""
+    store = ConfigStore()
+    monkeypatch.setattr(manifest, "config_store", store)
+    path = tmp_path / "mocks.yaml"
+    path.write_text(MANIFEST)
+
+    watcher = manifest.ManifestWatcher(path, poll_interval=1)
+    assert watcher.reload()
+    assert not watcher.reload()
+    first = store.current()
+
+    path.write_text("endpoints: [")
+    os.utime(path, ns=(0, 1))
+    with pytest.raises(ValueError):
+        watcher.reload()
+    assert not watcher.reload()
+    assert store.current() is first
+
+    path.write_text(MANIFEST.replace("users", "accounts"))
+    assert watcher.reload()
+    assert store.current().match("GET", "/accounts/1")[0].name == "accounts"
+
+
+def test_load_manifest_rejects_empty_paths(tmp_path):
+    """Test that an endpoint without a path is reported as an invalid manifest"""
+    path = tmp_path / "mocks.yaml"
+    path.write_text(MANIFEST.replace("path: users/<user_id>", 'path: ""'))
+
+    with pytest.raises(ValueError, match="path must not be empty"):
+        manifest.load_manifest(path)
@@ -0,0 +1,106 @@
+"""Unit tests for the prometheus metrics."""
+
+from flask import Flask
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, values
+
+from api_reflector import callbacks, manifest, metrics, storage, templating, views
+from api_reflector.config_io import parse
+from api_reflector.snapshot import ConfigStore
+from settings import settings
+
+MANIFEST = """
+endpoints:
+  - name: users
+    method: GET
+    path: users/<user_id>
+    responses:
+      - name: default
+        content: '{"id": "{{ request.params.user_id }}"}'
+"""
+
+
+def sample(name: str, **labels: str) -> float:
+    """Returns the current value of the given sample, or 0 if it hasn't been recorded yet"""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_mock_requests_are_measured(monkeypatch):
+    """Test that served mocks are counted and timed by endpoint and status, and each phase is timed"""
+    store = ConfigStore()
+    store.publish(manifest.build_endpoints(parse(MANIFEST, "yaml")))
+    monkeypatch.setattr(views, "config_store", store)
+    monkeypatch.setattr(settings, "journal_enabled", False)
+    app = Flask(__name__)
+    app.register_blueprint(views.api)
+    client = app.test_client()
+
+    matched = {"endpoint": "GET /users/<user_id>", "method": "GET", "status": "200"}
+    unmatched = {"endpoint": metrics.UNMATCHED, "method": "GET", "status": "404"}
+    before = {
+        "matched": sample("reflector_mock_requests_total", **matched),
+        "unmatched": sample("reflector_mock_requests_total", **unmatched),
+        "duration": sample("reflector_mock_request_duration_seconds_count", endpoint=matched["endpoint"]),
+        "phases": {
+            phase: sample("reflector_mock_phase_duration_seconds_count", phase=phase) for phase in metrics.PHASES
+        },
+    }
+
+    assert client.get("/mock/users/1").status_code == 200
+    assert client.get("/mock/users/2").status_code == 200
+    assert client.get("/mock/nothing").status_code == 404
+
+    assert sample("reflector_mock_requests_total", **matched) == before["matched"] + 2
+    assert sample("reflector_mock_requests_total", **unmatched) == before["unmatched"] + 1
+    assert (
+        sample("reflector_mock_request_duration_seconds_count", endpoint=matched["endpoint"]) == before["duration"] + 2
+    )
+    assert sample("reflector_mock_phase_duration_seconds_count", phase="match_endpoint") == (
+        before["phases"]["match_endpoint"] + 3
+    )
+    for phase in ("find_best_response", "render", "execute_actions"):
+        assert sample("reflector_mock_phase_duration_seconds_count", phase=phase) == before["phases"][phase] + 2
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    assert b'reflector_mock_requests_total{endpoint="GET /users/<user_id>",method="GET",status="200"}' in response.data
+
+
+def test_metrics_are_aggregated_across_workers(monkeypatch, tmp_path):
+    """Test that in multiprocess mode, metrics written by each worker are added up"""
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+
+    for pid in (1001, 1002):
+        # as if each worker had created the counter in its own process.
+        monkeypatch.setattr(values, "ValueClass", values.MultiProcessValue(lambda pid=pid: pid))
+        Counter("reflector_test_total", "Test counter.", registry=CollectorRegistry()).inc(pid - 1000)
+
+    body, _ = metrics.generate()
+    assert b"reflector_test_total 3.0" in body
+    # the stats of the process serving /metrics are exported alongside.
+    assert b"reflector_template_cache_hits_total" in body
+
+
+def test_stats_sources_are_exported(monkeypatch):
+    """Test that the counters kept by components are exported when metrics are collected"""
+    backend = storage.MemoryBackend()
+    backend.set("a", "1", expiry=2**40)
+    monkeypatch.setattr(storage, "_backend", backend)
+
+    templating.template_cache.clear()
+    templating.compile_template("{{ 1 }}")
+    templating.compile_template("{{ 1 }}")
+
+    assert REGISTRY.get_sample_value("reflector_storage_live_keys") == 1
+    assert REGISTRY.get_sample_value("reflector_template_cache_hits_total") == 1
+    assert REGISTRY.get_sample_value("reflector_template_cache_misses_total") == 1
+    assert (
+        REGISTRY.get_sample_value("reflector_callback_queue_depth") == callbacks.callback_dispatcher.stats().queue_depth
+    )
+
+    # postgres storage keeps no counters in-process.
+    monkeypatch.setattr(storage, "_backend", storage.CachedBackend(storage.PostgresBackend(), ttl=1))
+    assert REGISTRY.get_sample_value("reflector_storage_live_keys") is None
+
+    body, _ = metrics.generate()
+    assert b"reflector_callbacks_delivered_total" in body
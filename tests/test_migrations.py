@@ -0,0 +1,29 @@
+"""Unit tests for running migrations on startup."""
+
+from api_reflector.migrations import run_migrations
+from settings import settings
+
+
+def test_upgrade_if_needed(monkeypatch, tmp_path):
+    """Test that migrations only run when the database isn't at head, checking again once the lock is held"""
+    monkeypatch.setattr(settings, "lockfile_path", tmp_path / "migrations.lock")
+    upgrades = []
+
+    def upgrade(argv):
+        upgrades.append(argv)
+
+    monkeypatch.setattr(run_migrations.alembic.config, "main", upgrade)
+
+    monkeypatch.setattr(run_migrations, "is_at_head", lambda: True)
+    assert not run_migrations.upgrade_if_needed()
+    assert not upgrades
+
+    # another process finished migrating while we waited for the lock.
+    checks = iter([False, True])
+    monkeypatch.setattr(run_migrations, "is_at_head", lambda: next(checks))
+    assert not run_migrations.upgrade_if_needed()
+    assert not upgrades
+
+    monkeypatch.setattr(run_migrations, "is_at_head", lambda: False)
+    assert run_migrations.upgrade_if_needed()
+    assert upgrades == [run_migrations.alembic_args]
@@ -0,0 +1,99 @@
+"""Unit tests for configuration change notifications."""
+
+import json
+import threading
+
+from flask import Flask
+
+from api_reflector import notifications
+from api_reflector.notifications import ConfigListener, make_payload, origin
+
+
+class FakeStore:
+    """Records what the listener asked the configuration store to do"""
+
+    def __init__(self) -> None:
+        self.invalidated = 0
+        self.refreshed: list[set[int]] = []
+
+    def invalidate(self) -> None:
+        """Counts full reloads"""
+        self.invalidated += 1
+
+    def refresh(self, endpoint_ids) -> None:
+        """Records partial reloads"""
+        self.refreshed.append(set(endpoint_ids))
+
+
+def test_make_payload():
+    """Test that payloads name the changed endpoints, or everything if there are too many"""
+    assert json.loads(make_payload([3, 1], 7)) == {"origin": origin(), "version": 7, "endpoints": [1, 3]}
+    assert json.loads(make_payload(None, 7))["endpoints"] is None
+    assert json.loads(make_payload(range(10_000), 7)) == {"origin": origin(), "version": 7, "endpoints": None}
+
+
+def test_listener_refreshes_changed_endpoints(monkeypatch):
+    """Test that notifications from other processes reload only the endpoints they name"""
+    store = FakeStore()
+    monkeypatch.setattr(notifications, "config_store", store)
+    listener = ConfigListener(reconnect_interval=1)
+    monkeypatch.setattr(listener, "_app", Flask(__name__))
+
+    other = json.dumps({"origin": "elsewhere:1", "endpoints": [1, 2]})
+    own = json.dumps({"origin": origin(), "endpoints": [3]})
+    listener.apply([other, own, json.dumps({"origin": "elsewhere:2", "endpoints": [2, 4]}), "not json"])
+    assert store.refreshed == [{1, 2, 4}]
+    assert store.invalidated == 0
+
+    listener.apply([other, json.dumps({"origin": "elsewhere:1", "endpoints": None})])
+    assert store.refreshed == [{1, 2, 4}]
+    assert store.invalidated == 1
+
+
+def test_listener_starts_again_after_fork(monkeypatch):
+    """Test that a started listener starts its thread again in each new process, and only once per process"""
+    listener = ConfigListener(reconnect_interval=1)
+    started = threading.Semaphore(0)
+    monkeypatch.setattr(listener, "_work", started.release)
+
+    listener.ensure_started()
+    assert not started.acquire(timeout=0.1)
+
+    listener.start(Flask(__name__))
+    listener.ensure_started()
+    assert started.acquire(timeout=5)
+    assert not started.acquire(timeout=0.1)
+
+    # as if this process had been forked from the one that started the listener.
+    monkeypatch.setattr(listener, "_pid", -1)
+    listener.ensure_started()
+    listener.ensure_started()
+    assert started.acquire(timeout=5)
+    assert not started.acquire(timeout=0.1)
+
+
+def test_listener_reloads_everything_after_missed_versions(monkeypatch):
+    """Test that a gap in the configuration versions reloads everything, and consecutive versions don't"""
+    store = FakeStore()
+    monkeypatch.setattr(notifications, "config_store", store)
+    listener = ConfigListener(reconnect_interval=1)
+    monkeypatch.setattr(listener, "_app", Flask(__name__))
+
+    def change(version, endpoints, source="elsewhere:1"):
+        return json.dumps({"origin": source, "version": version, "endpoints": endpoints})
+
+    # our own notifications advance the version without being applied.
+    listener.apply([change(4, [1]), change(5, [2], source=origin()), change(6, [])])
+    assert store.refreshed == [{1}]
+    assert store.invalidated == 0
+
+    listener.apply([change(7, [3])])
+    assert store.refreshed == [{1}, {3}]
+    assert store.invalidated == 0
+
+    listener.apply([change(10, [4])])
+    assert store.refreshed == [{1}, {3}]
+    assert store.invalidated == 1
+
+    listener.apply([change(11, [])])
+    assert store.invalidated == 1
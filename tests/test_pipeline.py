@@ -0,0 +1,36 @@
+"""Unit tests for the mock serving pipeline."""
+
+import pytest
+from jinja2.exceptions import UndefinedError
+
+from api_reflector import pipeline
+from api_reflector.rules_engine import TemplatableRequest
+from api_reflector.snapshot import ResponseSnapshot
+
+
+def make_response(content: str) -> ResponseSnapshot:
+    """Builds a streamed response with the given content"""
+    return ResponseSnapshot(1, "test", 200, "application/json", content, True, (), (), stream=True)
+
+
+def make_request(**params) -> TemplatableRequest:
+    """Builds a request with the given URL parameters"""
+    return TemplatableRequest(params=params, json={}, query={}, headers={})
+
+
+def test_stream_content_matches_render_content():
+    """Test that streamed content is the same as rendered content, sent in chunks"""
+    response = make_response('[{% for i in range(request.params.n) %}"{{ i }}",{% endfor %}"end"]')
+    request = make_request(n=10_000)
+
+    chunks = list(pipeline.stream_content(response, request))
+
+    assert "".join(chunks) == pipeline.render_content(response, request)
+    assert len(chunks) > 1
+    assert all(len(chunk) >= pipeline.STREAM_CHUNK_SIZE for chunk in chunks[:-1])
+
+
+def test_stream_content_raises_early_errors():
+    """Test that errors in the first chunk are raised before streaming starts"""
+    with pytest.raises(UndefinedError):
+        pipeline.stream_content(make_response("{{ missing.field }}"), make_request())
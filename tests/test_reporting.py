@@ -0,0 +1,92 @@
+"""Unit tests for logging setup."""
+
+import logging
+import random
+import threading
+
+from api_reflector.reporting import BackgroundHandler, JSONFormatter, SamplingFilter
+
+
+class ListHandler(logging.Handler):
+    """Collects the formatted records it handles"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages: list[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(self.format(record))
+
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    """Builds a logger that only writes to the given handler"""
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def test_background_handler_writes_records():
+    """Test that records are formatted and written by the background thread"""
+    output = ListHandler()
+    output.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    handler = BackgroundHandler(output, capacity=100)
+    logger = make_logger("test-background", handler)
+
+    items = ["a"]
+    logger.info("items: %s", items)
+    items.append("b")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("failed")
+    handler.stop()
+
+    assert output.messages[0] == "INFO items: ['a']"
+    assert output.messages[1].startswith("ERROR failed\nTraceback")
+    assert "ValueError: boom" in output.messages[1]
+
+
+def test_background_handler_drops_when_full():
+    """Test that records are dropped rather than waited on when the queue is full"""
+    writing = threading.Event()
+    release = threading.Event()
+
+    class BlockingHandler(ListHandler):
+        """Blocks the writer thread until released"""
+
+        def emit(self, record: logging.LogRecord) -> None:
+            writing.set()
+            release.wait()
+            super().emit(record)
+
+    output = BlockingHandler()
+    handler = BackgroundHandler(output, capacity=1)
+    logger = make_logger("test-full", handler)
+
+    logger.info("first")
+    assert writing.wait(5)
+    for index in range(3):
+        logger.info("message %d", index)
+    release.set()
+    handler.stop()
+
+    assert handler.dropped == 2
+    assert output.messages == ["first", "message 0"]
+
+
+def test_json_formatter_merges_arguments():
+    """Test that JSON log messages include their arguments"""
+    record = logging.makeLogRecord({"msg": "Matched `%s`", "args": ("/users/1",), "levelno": logging.INFO})
+    assert '"message": "Matched `/users/1`"' in JSONFormatter().format(record)
+
+
+def test_sampling_filter():
+    """Test that only a sample of info records is kept, and warnings are always kept"""
+    random.seed(0)
+    sampler = SamplingFilter(0.1)
+
+    kept = sum(sampler.filter(logging.makeLogRecord({"levelno": logging.INFO})) for _ in range(1000))
+    assert 50 < kept < 150
+    assert all(sampler.filter(logging.makeLogRecord({"levelno": logging.WARNING})) for _ in range(100))
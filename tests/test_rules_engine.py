@@ -1,7 +1,20 @@
 """Unit tests for the rules engine."""
+import random
 
+import pytest
 
-from api_reflector.rules_engine import Operator, evaluators
+from api_reflector.rules_engine import (
+    Operator,
+    RenderContext,
+    ResponseIndex,
+    ScoringRule,
+    TemplatableRequest,
+    compile_rule,
+    compile_rules,
+    evaluators,
+    find_best_response,
+    score_response,
+)
 
 
 def test_operators():
@@ -37,3 +50,125 @@ def test_operators():
     for operator, args, result in cases:
         evaluator = evaluators[operator]
         assert evaluator(*args) == result
+
+
+def make_request(**params) -> TemplatableRequest:
+    """Builds a request with the given URL parameters"""
+    return TemplatableRequest(params=params, json={}, query={}, headers={})
+
+
+def test_compile_rule_literals():
+    """Test that literal arguments are evaluated at compile time"""
+    rule = compile_rule(ScoringRule(Operator.GREATER_THAN, ["{{ request.params.n }}", "10"]))
+    assert rule.cost == 1
+
+    rendered = []
+
+    def render(source):
+        rendered.append(source)
+        return "11"
+
+    assert rule.predicate(render)
+    assert rendered == ["{{ request.params.n }}"]
+
+
+def test_compile_rules_order():
+    """Test that cheap & selective rules are evaluated first"""
+    rules = compile_rules(
+        [
+            ScoringRule(Operator.NOT_EQUAL, ["{{ request.params.a }}", "{{ request.params.b }}"]),
+            ScoringRule(Operator.IS_NOT_EMPTY, ["{{ request.params.a }}"]),
+            ScoringRule(Operator.EQUAL, ["{{ request.params.a }}", "1"]),
+            ScoringRule(Operator.EQUAL, ["1", "1"]),
+        ]
+    )
+    assert [(rule.operator, rule.cost) for rule in rules] == [
+        (Operator.EQUAL, 0),
+        (Operator.EQUAL, 1),
+        (Operator.IS_NOT_EMPTY, 1),
+        (Operator.NOT_EQUAL, 2),
+    ]
+
+
+def test_score_response_keeps_rule_order():
+    """Test that rules are evaluated in the order they're given, rather than being sorted again for every request"""
+    not_a_number = compile_rule(ScoringRule(Operator.GREATER_THAN, ["x", "1"]))
+    mismatch = compile_rule(ScoringRule(Operator.EQUAL, ["a", "b"]))
+
+    assert score_response(make_request(), compile_rules([not_a_number, mismatch])) == -1
+    with pytest.raises(ValueError):
+        score_response(make_request(), (not_a_number, mismatch))
+
+
+def test_find_best_response():
+    """Test that the response with the most passing rules is chosen"""
+    is_one = ScoringRule(Operator.EQUAL, ["{{ request.params.id }}", "1"])
+    is_small = ScoringRule(Operator.LESS_THAN, ["{{ request.params.id }}", "10"])
+    response_rules = [
+        ("default", []),
+        ("small", [is_small]),
+        ("one", compile_rules([is_one, is_small])),
+    ]
+
+    assert find_best_response(make_request(id="1"), response_rules) == "one"
+    assert find_best_response(make_request(id="5"), response_rules) == "small"
+    assert find_best_response(make_request(id="50"), response_rules) == "default"
+
+
+def test_render_context_memoizes():
+    """Test that each template source is rendered once per request"""
+    context = RenderContext(make_request(id="1"))
+    first = context.render("{{ uuid() }}")
+
+    assert context.render("{{ uuid() }}") == first
+    assert context.render("{{ request.params.id }}") == "1"
+
+
+def test_response_index_selects_equal_values():
+    """Test that the index only selects responses whose EQUAL rule could pass, and those without one"""
+    item = "{{ request.params.id }}"
+    response_rules = [(f"item {n}", [ScoringRule(Operator.EQUAL, [item, str(n)])]) for n in range(100)]
+    response_rules.append(("reversed", [ScoringRule(Operator.EQUAL, ["7", item])]))
+    response_rules.append(("small", [ScoringRule(Operator.LESS_THAN, [item, "10"])]))
+    response_rules.append(("default", []))
+    index = ResponseIndex(response_rules)
+
+    assert index.expression == item
+    selected = [response for response, _ in index.select(RenderContext(make_request(id="7")))]
+    assert selected == ["item 7", "reversed", "small", "default"]
+    assert index.find_best(make_request(id="42")) == "item 42"
+    assert index.find_best(make_request(id="500")) == "default"
+
+
+def test_response_index_matches_find_best_response():
+    """Test that the index chooses exactly the same responses as scoring every response"""
+    item = "{{ request.params.id }}"
+    kind = "{{ request.params.kind }}"
+    response_rules = [
+        ("default", []),
+        ("a", [ScoringRule(Operator.EQUAL, [item, "1"])]),
+        ("b", [ScoringRule(Operator.EQUAL, [item, "1"])]),
+        ("c", [ScoringRule(Operator.EQUAL, [item, "2"]), ScoringRule(Operator.EQUAL, [kind, "x"])]),
+        ("d", [ScoringRule(Operator.EQUAL, [item, "2"]), ScoringRule(Operator.EQUAL, [item, "3"])]),
+        ("e", [ScoringRule(Operator.EQUAL, [kind, "y"])]),
+        ("f", [ScoringRule(Operator.GREATER_THAN, [item, "1"])]),
+    ]
+    index = ResponseIndex(response_rules)
+
+    for item_id in ("1", "2", "3", "4"):
+        for kind_id in ("x", "y", "z"):
+            request = make_request(id=item_id, kind=kind_id)
+            random.seed(item_id + kind_id)
+            expected = [find_best_response(request, response_rules) for _ in range(10)]
+            random.seed(item_id + kind_id)
+            assert [index.find_best(request) for _ in range(10)] == expected
+
+
+def test_response_index_without_equal_rules():
+    """Test that responses are all scored when there's nothing to index"""
+    response_rules = [("default", []), ("one", [ScoringRule(Operator.EQUAL, ["{{ request.params.id }}", "1"])])]
+    index = ResponseIndex(response_rules)
+
+    assert index.expression is None
+    assert len(index.select(RenderContext(make_request(id="2")))) == 2
+    assert index.find_best(make_request(id="1")) == "one"
@@ -0,0 +1,130 @@
+"""Unit tests for activating scenarios. These need the database given by `postgres_dsn`, and are skipped without it."""
+
+import os
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, insert, pool, select, text
+from sqlalchemy.exc import OperationalError
+
+from api_reflector import db, models, scenarios, views
+from settings import settings
+
+SCHEMA = f"test_scenarios_{os.getpid()}"
+
+
+@pytest.fixture(name="engine")
+def fixture_engine():
+    """An engine for a new schema holding the application tables, dropped afterwards"""
+    options = {"poolclass": pool.NullPool, "connect_args": {"options": f"-csearch_path={SCHEMA}"}}
+    engine = create_engine(settings.database_url, **options)
+    try:
+        with engine.connect() as connection:
+            connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    except OperationalError as ex:
+        pytest.skip(f"database is not available: {ex}")
+
+    try:
+        models.Model.metadata.create_all(engine)
+        yield engine
+    finally:
+        with engine.connect() as connection:
+            connection.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+        engine.dispose()
+
+
+def add_responses(engine, tags: dict[str, list[int]]) -> None:
+    """
+    Adds endpoints 1 to 3 with two responses each, and the given tags of response ids. The responses of endpoint 1 are
+    11 and 12, and so on. Only the first response of each endpoint is active.
+    """
+    with engine.begin() as connection:
+        for endpoint_id in (1, 2, 3):
+            connection.execute(
+                insert(models.Endpoint.__table__).values(
+                    id=endpoint_id, name=str(endpoint_id), method="GET", path=f"/{endpoint_id}"
+                )
+            )
+            for response in (1, 2):
+                connection.execute(
+                    insert(models.Response.__table__).values(
+                        id=endpoint_id * 10 + response,
+                        name=str(response),
+                        endpoint_id=endpoint_id,
+                        status_code=200,
+                        content_type="text/plain",
+                        content="",
+                        is_active=response == 1,
+                    )
+                )
+
+        for tag_id, (name, response_ids) in enumerate(tags.items(), start=1):
+            connection.execute(insert(models.Tag.__table__).values(id=tag_id, name=name))
+            for response_id in response_ids:
+                connection.execute(insert(models.response_tag).values(response_id=response_id, tag_id=tag_id))
+
+
+def active_responses(engine) -> list[int]:
+    """Returns the ids of the active responses"""
+    response = models.Response.__table__
+    with engine.connect() as connection:
+        return (
+            connection.execute(select(response.c.id).where(response.c.is_active).order_by(response.c.id))
+            .scalars()
+            .all()
+        )
+
+
+def test_activate_scenario(engine):
+    """Test that a scenario's responses become the only active responses of their endpoints, and only those flip"""
+    add_responses(engine, {"errors": [12, 22], "mixed": [11, 12], "empty": []})
+
+    with engine.connect() as connection:
+        summary = scenarios.activate_scenario(connection, "errors")
+    assert summary == scenarios.ActivationSummary(activated=[12, 22], deactivated=[11, 21], endpoints=[1, 2])
+    assert summary.changes == {12: True, 22: True, 11: False, 21: False}
+    # the third endpoint has no tagged responses, so it's left alone.
+    assert active_responses(engine) == [12, 22, 31]
+
+    # both of the first endpoint's responses are tagged, so they're both active. responses that are already in the
+    # right state aren't reported.
+    with engine.connect() as connection:
+        summary = scenarios.activate_scenario(connection, "mixed")
+    assert summary == scenarios.ActivationSummary(activated=[11], deactivated=[], endpoints=[1])
+    assert active_responses(engine) == [11, 12, 22, 31]
+
+    with engine.connect() as connection:
+        assert scenarios.activate_scenario(connection, "empty") == scenarios.ActivationSummary([], [], [])
+        assert scenarios.activate_scenario(connection, "mixed") == scenarios.ActivationSummary([], [], [])
+
+        with pytest.raises(LookupError):
+            scenarios.activate_scenario(connection, "missing")
+    assert active_responses(engine) == [11, 12, 22, 31]
+
+
+def test_scenario_api(engine, monkeypatch):
+    """Test that the scenario API activates scenarios, and responds with a 404 for unknown tags"""
+    add_responses(engine, {"errors": [12, 22]})
+    monkeypatch.setattr(settings, "config_notifications_enabled", False)
+
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=settings.database_url,
+        SQLALCHEMY_ENGINE_OPTIONS={"connect_args": {"options": f"-csearch_path={SCHEMA}"}},
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    )
+    db.sqla.init_app(app)
+    app.register_blueprint(views.api)
+    client = app.test_client()
+
+    response = client.post("/api/scenarios/missing")
+    assert response.status_code == 404
+    assert response.get_data(as_text=True) == "No tag named `missing`"
+
+    response = client.post("/api/scenarios/errors")
+    assert response.status_code == 200
+    assert response.json == {"activated": [12, 22], "deactivated": [11, 21], "endpoints": [1, 2]}
+    assert active_responses(engine) == [12, 22, 31]
+
+    with app.app_context():
+        db.sqla.get_engine(app).dispose()
@@ -0,0 +1,191 @@
+"""Unit tests for configuration snapshots."""
+
+from typing import Optional
+
+import pytest
+from werkzeug.exceptions import NotFound
+
+from api_reflector import models, snapshot
+from api_reflector.actions import Action
+from api_reflector.endpoint import Method
+from api_reflector.rules_engine import Operator
+from api_reflector.snapshot import (
+    ActionSnapshot,
+    ConfigSnapshot,
+    ConfigStore,
+    EndpointSnapshot,
+    encode_static,
+    snapshot_endpoint,
+)
+
+
+class FakeDatabase:
+    """Stands in for `load_endpoints`, serving the endpoints it holds and recording where each load read from"""
+
+    def __init__(self, *endpoints: models.Endpoint) -> None:
+        self.endpoints: dict[int, EndpointSnapshot] = {}
+        for endpoint in endpoints:
+            self.save(endpoint)
+        self.loads: list[tuple[Optional[set[int]], bool]] = []
+
+    def save(self, endpoint: models.Endpoint) -> None:
+        """Stores the current state of the given endpoint"""
+        endpoint_snapshot = snapshot_endpoint(endpoint)
+        self.endpoints[endpoint_snapshot.id] = endpoint_snapshot
+
+    def load(self, endpoint_ids=None, from_primary=False):
+        """Returns the given endpoints, or all of them"""
+        self.loads.append((None if endpoint_ids is None else set(endpoint_ids), from_primary))
+        return {
+            endpoint_id: endpoint
+            for endpoint_id, endpoint in self.endpoints.items()
+            if endpoint_ids is None or endpoint_id in endpoint_ids
+        }
+
+
+def make_endpoint(path: str = "/users/<user_id>", content: str = "hi") -> models.Endpoint:
+    """Builds a transient endpoint with a single response"""
+    endpoint = models.Endpoint(id=1, name="user", method=Method.GET, path=path)
+    models.Response(
+        id=2,
+        name="ok",
+        endpoint=endpoint,
+        status_code=200,
+        content_type="text/plain",
+        content=content,
+        is_active=True,
+        rules=[models.Rule(id=3, operator=Operator.EQUAL, arguments=["{{ request.params.user_id }}", "1"])],
+        actions=[models.Action(id=4, action=Action.DELAY, arguments=["1"])],
+    )
+    return endpoint
+
+
+def test_snapshot_endpoint():
+    """Test that models are copied into snapshots"""
+    endpoint = snapshot_endpoint(make_endpoint())
+
+    assert (endpoint.id, endpoint.method, endpoint.path) == (1, "GET", "/users/<user_id>")
+    (response,) = endpoint.responses
+    assert (response.id, response.status_code, response.content) == (2, 200, "hi")
+    assert [(rule.operator, rule.arguments) for rule in response.rules] == [
+        (Operator.EQUAL, ("{{ request.params.user_id }}", "1"))
+    ]
+    assert response.actions == (ActionSnapshot(Action.DELAY, ("1",)),)
+    assert endpoint.response_index is not None
+    assert [candidate for candidate, _ in endpoint.response_index.candidates] == [response]
+
+
+def test_snapshot_match():
+    """Test that snapshots route paths to endpoints by method"""
+    endpoint = snapshot_endpoint(make_endpoint())
+    snapshot = ConfigSnapshot(0, {endpoint.id: endpoint})
+
+    assert snapshot.match("get", "/users/42") == (endpoint, {"user_id": "42"})
+    with pytest.raises(NotFound):
+        snapshot.match("GET", "/accounts/42")
+    with pytest.raises(NotFound):
+        snapshot.match("POST", "/users/42")
+
+
+def test_encode_static():
+    """Test that only content without template syntax is pre-encoded"""
+    assert encode_static('{"static": "café"}') == '{"static": "café"}'.encode()
+    assert encode_static("trailing newline\n") == b"trailing newline"
+    assert encode_static('{"id": "{{ uuid() }}"}') is None
+    assert encode_static("{% if true %}yes{% endif %}") is None
+
+
+def test_snapshot_request_fields():
+    """Test that endpoints know which request fields their responses read"""
+    endpoint = make_endpoint()
+    snapshot = snapshot_endpoint(endpoint)
+    assert snapshot.request_fields == {"params"}
+
+    endpoint.responses[0].actions.append(models.Action(id=5, action=Action.CALLBACK, arguments=["url=http://x"]))
+    assert snapshot_endpoint(endpoint).request_fields == {"params", "json"}
+
+
+def test_apply_active():
+    """Test that response active states can be changed in the current snapshot without a reload"""
+    endpoint = snapshot_endpoint(make_endpoint())
+    store = ConfigStore()
+    before = store.publish({endpoint.id: endpoint})
+
+    store.apply_active({2: False})
+    after = store.current()
+    (response,) = after.endpoints[endpoint.id].responses
+    assert not response.is_active
+    assert after.endpoints[endpoint.id].response_index is None
+    assert after.routes is before.routes
+
+    # a stale snapshot is reloaded from the database anyway, so it's left alone.
+    store.invalidate()
+    store.apply_active({2: True})
+    assert store.is_stale
+
+
+def test_reloads_after_changes_read_from_primary(monkeypatch):
+    """Test that only loads that don't follow a change use the read replica"""
+    database = FakeDatabase(make_endpoint())
+    monkeypatch.setattr(snapshot, "load_endpoints", database.load)
+    store = ConfigStore()
+
+    store.current()
+    store.refresh({1})
+    store.invalidate()
+    store.current()
+    store.current()
+    store.invalidate(from_primary=False)
+    store.current()
+
+    assert database.loads == [(None, False), ({1}, True), (None, True), (None, False)]
+
+
+def test_refresh(monkeypatch):
+    """Test that refreshing reloads only the given endpoints, and only rebuilds the routes if a route changed"""
+    database = FakeDatabase(
+        make_endpoint(), models.Endpoint(id=5, name="accounts", method=Method.GET, path="/accounts")
+    )
+    monkeypatch.setattr(snapshot, "load_endpoints", database.load)
+    store = ConfigStore()
+
+    # nothing has been loaded yet, so there's nothing to refresh.
+    store.refresh({1})
+    assert not database.loads
+
+    first = store.current()
+    first.match("GET", "/accounts")
+
+    # a changed endpoint is replaced, everything else is kept as it is.
+    database.save(make_endpoint(content="changed"))
+    store.refresh({1})
+    changed = store.current()
+    assert changed.endpoints[1].responses[0].content == "changed"
+    assert changed.endpoints[5] is first.endpoints[5]
+    assert changed.routes is first.routes
+    assert changed.match("GET", "/users/1")[0].responses[0].content == "changed"
+
+    # a new route rebuilds the routing table.
+    database.save(make_endpoint(path="/people/<user_id>", content="changed"))
+    store.refresh({1})
+    rerouted = store.current()
+    assert rerouted.routes is not changed.routes
+    assert rerouted.match("GET", "/people/1")[0].id == 1
+    with pytest.raises(NotFound):
+        rerouted.match("GET", "/users/1")
+
+    # endpoints that no longer exist are removed.
+    del database.endpoints[5]
+    store.refresh({5})
+    removed = store.current()
+    assert set(removed.endpoints) == {1}
+    assert removed.routes is not rerouted.routes
+    with pytest.raises(NotFound):
+        removed.match("GET", "/accounts")
+
+    # a stale snapshot is reloaded in full anyway, so it's left alone.
+    loads = len(database.loads)
+    store.invalidate()
+    store.refresh({1})
+    assert len(database.loads) == loads
+    assert store.is_stale
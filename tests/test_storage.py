@@ -0,0 +1,66 @@
+"""Unit tests for global storage backends."""
+
+import time
+
+from api_reflector.storage import CachedBackend, MemoryBackend, StorageStats
+
+
+def test_memory_backend_expiry():
+    """Test that expired values are not returned"""
+    backend = MemoryBackend()
+    backend.set("live", "1", time.time() + 60)
+    backend.set("dead", "2", time.time() - 1)
+
+    assert backend.get("live") == "1"
+    assert backend.get("dead") is None
+    assert backend.get("missing") is None
+
+
+def test_cached_backend_reads_through():
+    """Test that reads are cached and writes go through"""
+    inner = MemoryBackend()
+    backend = CachedBackend(inner, ttl=60)
+
+    inner.set("a", "1", time.time() + 60)
+    assert backend.get("a") == "1"
+
+    inner.set("a", "2", time.time() + 60)
+    assert backend.get("a") == "1"
+
+    backend.set("a", "3", time.time() + 60)
+    assert backend.get("a") == "3"
+    assert inner.get("a") == "3"
+
+
+def test_cached_backend_expiry():
+    """Test that cached values respect their own expiry"""
+    backend = CachedBackend(MemoryBackend(), ttl=60)
+    backend.set("a", "1", time.time() - 1)
+
+    assert backend.get("a") is None
+
+
+def test_memory_backend_sweeps_unread_values():
+    """Test that expired values are removed in the background, without being read or written again"""
+    backend = MemoryBackend(sweep_interval=0.01)
+    backend.set("a", "1", time.time() + 0.05)
+    backend.set("b", "2", time.time() + 60)
+
+    deadline = time.monotonic() + 5
+    while backend.stats().live_keys > 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert backend.stats() == StorageStats(live_keys=1, expirations=1, evictions=0)
+
+
+def test_memory_backend_evicts_soonest_to_expire():
+    """Test that the backend is bounded"""
+    backend = MemoryBackend(max_keys=2)
+    backend.set("a", "1", time.time() + 30)
+    backend.set("b", "2", time.time() + 10)
+    backend.set("a", "3", time.time() + 60)
+    backend.set("c", "4", time.time() + 20)
+
+    assert backend.get("b") is None
+    assert (backend.get("a"), backend.get("c")) == ("3", "4")
+    assert backend.stats() == StorageStats(live_keys=2, expirations=0, evictions=1)
@@ -0,0 +1,67 @@
+"""Unit tests for the template cache and template analysis."""
+
+import pytest
+from jinja2 import FileSystemBytecodeCache
+
+from api_reflector.templating import (
+    REQUEST_FIELDS,
+    TemplateCache,
+    referenced_request_fields,
+    template_env,
+)
+
+
+def test_template_cache_hits_and_misses():
+    """Test that templates are compiled once per source"""
+    cache = TemplateCache(template_env, maxsize=8)
+
+    first = cache.get("{{ x }}")
+    second = cache.get("{{ x }}")
+
+    assert first is second
+    assert first.render(x=1) == "1"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_template_cache_evicts_least_recently_used():
+    """Test that the cache is bounded"""
+    cache = TemplateCache(template_env, maxsize=2)
+
+    first = cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+
+    assert len(cache) == 2
+    assert cache.get("a") is first
+    assert cache.misses == 3
+
+
+def test_template_cache_bytecode_cache(tmp_path):
+    """Test that compiled code is shared through the bytecode cache"""
+    source = "{{ x + 1 }}"
+    TemplateCache(template_env, maxsize=8, bytecode_cache=FileSystemBytecodeCache(str(tmp_path))).get(source)
+    assert list(tmp_path.iterdir())
+
+    template = TemplateCache(template_env, maxsize=8, bytecode_cache=FileSystemBytecodeCache(str(tmp_path))).get(source)
+    assert template.render(x=1) == "2"
+
+
+@pytest.mark.parametrize(
+    "source, expected",
+    [
+        ('{"static": true}', set()),
+        ("{{ uuid() }}", set()),
+        ("{{ request.params.id }}", {"params"}),
+        ("{{ request.json.user.name }} {{ request.query.get('q') }}", {"json", "query"}),
+        ("{{ request['headers']['Host'] }}", {"headers"}),
+        ("{% for item in request.json['items'] %}{{ item }}{% endfor %}", {"json"}),
+        ("{{ request }}", REQUEST_FIELDS),
+        ("{% set r = request %}{{ r.params.id }}", REQUEST_FIELDS),
+        ("{{ request[field] }}", REQUEST_FIELDS),
+        ("{{ request.json", REQUEST_FIELDS),
+    ],
+)
+def test_referenced_request_fields(source, expected):
+    """Test that the request fields read by a template are found"""
+    assert referenced_request_fields(source) == expected